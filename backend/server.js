@@ -11,6 +11,8 @@ const execPromise = util.promisify(exec);
 const app = express();
 const PORT = process.env.PORT || 5000;
 const JWT_SECRET = process.env.JWT_SECRET || 'your-secret-key-change-in-production';
+// The ML scripts answer within their own deadline (ML_REQUEST_DEADLINE_MS); this is only a backstop
+const ML_EXEC_TIMEOUT_MS = parseInt(process.env.ML_EXEC_TIMEOUT_MS) || 15000;
 
 // Database connection
 const pool = new Pool({
@@ -235,16 +237,18 @@ app.get('/api/ml/eligibility-score', authenticateToken, async (req, res) => {
     // Call Python ML service
     const { stdout } = await execPromise(
       `python3 ml/inference.py eligibility ${req.user.id}`,
-      { cwd: __dirname + '/..' }
+      { cwd: __dirname + '/..', timeout: ML_EXEC_TIMEOUT_MS }
     );
 
     const result = JSON.parse(stdout);
     
-    // Save to database
-    await pool.query(
-      'INSERT INTO model_scores (user_id, eligibility_score, risk_level) VALUES ($1, $2, $3)',
-      [req.user.id, result.eligibility_score, result.risk_level]
-    );
+    // Save to database (degraded results are cached or fallback scores, not new ones)
+    if (!result.degraded) {
+      await pool.query(
+        'INSERT INTO model_scores (user_id, eligibility_score, risk_level) VALUES ($1, $2, $3)',
+        [req.user.id, result.eligibility_score, result.risk_level]
+      );
+    }
 
     res.json(result);
   } catch (error) {
@@ -258,15 +262,17 @@ app.get('/api/ml/health-score', authenticateToken, async (req, res) => {
   try {
     const { stdout } = await execPromise(
       `python3 ml/inference.py health ${req.user.id}`,
-      { cwd: __dirname + '/..' }
+      { cwd: __dirname + '/..', timeout: ML_EXEC_TIMEOUT_MS }
     );
 
     const result = JSON.parse(stdout);
     
-    await pool.query(
-      'UPDATE model_scores SET health_score = $1 WHERE user_id = $2',
-      [result.health_score, req.user.id]
-    );
+    if (!result.degraded) {
+      await pool.query(
+        'UPDATE model_scores SET health_score = $1 WHERE user_id = $2',
+        [result.health_score, req.user.id]
+      );
+    }
 
     res.json(result);
   } catch (error) {
@@ -396,35 +402,38 @@ app.post('/api/chatbot/message', authenticateToken, async (req, res) => {
     // Call Python NLP chatbot
     const { stdout } = await execPromise(
       `python3 ml/chatbot_nlp.py predict "${message.replace(/"/g, '\\"')}" ${req.user.id}`,
-      { cwd: __dirname + '/..' }
+      { cwd: __dirname + '/..', timeout: ML_EXEC_TIMEOUT_MS }
     );
 
     const nlpResult = JSON.parse(stdout);
     
-    // Get user context for action execution
-    const cashflowRes = await pool.query(
-      'SELECT AVG(CASE WHEN type = \'income\' THEN amount ELSE 0 END) as avg_income, AVG(CASE WHEN type = \'expense\' THEN amount ELSE 0 END) as avg_expense FROM transactions WHERE user_id = $1',
-      [req.user.id]
-    );
+    let response = nlpResult.response;
+    
+    // Actions resolved by the chatbot already carry the user's figures
+    if (nlpResult.action && !nlpResult.action_resolved) {
+      // Get user context for action execution
+      const cashflowRes = await pool.query(
+        'SELECT AVG(CASE WHEN type = \'income\' THEN amount ELSE 0 END) as avg_income, AVG(CASE WHEN type = \'expense\' THEN amount ELSE 0 END) as avg_expense FROM transactions WHERE user_id = $1',
+        [req.user.id]
+      );
 
-    const scoresRes = await pool.query(
-      'SELECT * FROM model_scores WHERE user_id = $1 ORDER BY created_at DESC LIMIT 1',
-      [req.user.id]
-    );
+      const scoresRes = await pool.query(
+        'SELECT * FROM model_scores WHERE user_id = $1 ORDER BY created_at DESC LIMIT 1',
+        [req.user.id]
+      );
 
-    const avgIncome = parseFloat(cashflowRes.rows[0]?.avg_income) || 0;
-    const avgExpense = parseFloat(cashflowRes.rows[0]?.avg_expense) || 0;
-    const healthScore = scoresRes.rows[0]?.health_score || 50;
-    const eligibilityScore = scoresRes.rows[0]?.eligibility_score || 50;
-    const riskLevel = scoresRes.rows[0]?.risk_level || 'MEDIUM';
+      const avgIncome = parseFloat(cashflowRes.rows[0]?.avg_income) || 0;
+      const avgExpense = parseFloat(cashflowRes.rows[0]?.avg_expense) || 0;
+      const healthScore = scoresRes.rows[0]?.health_score || 50;
+      const eligibilityScore = scoresRes.rows[0]?.eligibility_score || 50;
+      const riskLevel = scoresRes.rows[0]?.risk_level || 'MEDIUM';
 
-    let response = nlpResult.response;
-    
-    // Execute action based on intent
-    if (nlpResult.action) {
+      // Execute action based on intent
       switch (nlpResult.action) {
         case 'calculate_affordability':
-          const maxLoan = avgIncome * 0.4 * 24 / 0.01; // Simplified
+          // Same figure as the chatbot: the loan a 40% EMI repays over 24 months at 12% a year
+          const emiBudget = avgIncome * 0.4;
+          const maxLoan = emiBudget * (1 - Math.pow(1.01, -24)) / 0.01;
           response += `\n\nBased on your average monthly income of ₹${Math.round(avgIncome)}, you can afford a loan up to ₹${Math.round(maxLoan)} with comfortable EMI payments.`;
           break;
           
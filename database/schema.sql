@@ -82,6 +82,39 @@ CREATE TABLE model_scores (
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Re-scoring scheduler watermarks (last transactions.id already scored)
+CREATE TABLE rescore_watermarks (
+    name VARCHAR(50) PRIMARY KEY,
+    last_transaction_id INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Full-population scoring runs and their user-id-range shards (claimed with leases)
+CREATE TABLE scoring_runs (
+    id SERIAL PRIMARY KEY,
+    model_version VARCHAR(50) NOT NULL,
+    shard_size INTEGER NOT NULL,
+    status VARCHAR(20) DEFAULT 'RUNNING' CHECK (status IN ('RUNNING', 'COMPLETED')),
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    completed_at TIMESTAMP
+);
+
+CREATE TABLE scoring_shards (
+    run_id INTEGER REFERENCES scoring_runs(id) ON DELETE CASCADE,
+    shard_id INTEGER NOT NULL,
+    min_user_id INTEGER NOT NULL,
+    max_user_id INTEGER NOT NULL,
+    status VARCHAR(20) DEFAULT 'PENDING' CHECK (status IN ('PENDING', 'RUNNING', 'DONE')),
+    last_user_id INTEGER,
+    users_scored INTEGER NOT NULL DEFAULT 0,
+    lease_owner VARCHAR(100),
+    lease_expires_at TIMESTAMP,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    elapsed_seconds REAL,
+    completed_at TIMESTAMP,
+    PRIMARY KEY (run_id, shard_id)
+);
+
 -- Risk flags table
 CREATE TABLE risk_flags (
     id SERIAL PRIMARY KEY,
@@ -114,6 +147,9 @@ CREATE INDEX idx_transactions_type ON transactions(type);
 CREATE INDEX idx_loan_applications_user_id ON loan_applications(user_id);
 CREATE INDEX idx_loan_applications_status ON loan_applications(status);
 CREATE INDEX idx_model_scores_user_id ON model_scores(user_id);
+CREATE INDEX idx_model_scores_user_created ON model_scores(user_id, created_at DESC);
+CREATE INDEX idx_transactions_user_created ON transactions(user_id, created_at);
+CREATE INDEX idx_scoring_shards_claim ON scoring_shards(run_id, status, shard_id);
 CREATE INDEX idx_risk_flags_user_id ON risk_flags(user_id);
 CREATE INDEX idx_risk_flags_status ON risk_flags(status);
 
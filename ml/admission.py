@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+FinBridge ML Admission Control
+Bounds concurrent scoring work across the short-lived inference processes
+
+Every scoring request is its own process, so slots and queue places are
+lock files held with flock: the kernel releases them when a process exits
+or is killed, so a crashed request can never leak capacity. A request
+that finds no free slot takes a queue place and waits for a slot until
+its deadline; when the queue is full, or the deadline no longer leaves
+time to do the work, it is shed at once and answered with the user's last
+good result (or the standard fallback scores), marked as degraded.
+"""
+
+import contextlib
+import fcntl
+import json
+import os
+import sys
+import time
+
+# Configuration
+ADMISSION_DIR = 'ml/models/admission'
+RESULT_CACHE_DIR = 'ml/models/cache'
+MAX_CONCURRENT = int(os.getenv('ML_MAX_CONCURRENT', '4'))
+MAX_QUEUE = int(os.getenv('ML_MAX_QUEUE', '8'))
+REQUEST_DEADLINE_SECONDS = float(os.getenv('ML_REQUEST_DEADLINE_MS', '5000')) / 1000
+# Shed instead of starting work with less time left than this
+MIN_WORK_SECONDS = 0.5
+POLL_SECONDS = 0.01
+MAX_POLL_SECONDS = 0.1
+COUNTERS = ('admitted', 'queued', 'shed_queue_full', 'shed_deadline', 'deadline_exceeded')
+
+
+class Overloaded(Exception):
+    """The request was shed; ``reason`` is one of the shed counters"""
+
+    def __init__(self, reason):
+        super().__init__(f'ML service overloaded ({reason})')
+        self.reason = reason
+
+
+class Deadline:
+    """Absolute per-request deadline on the monotonic clock"""
+
+    def __init__(self, seconds=REQUEST_DEADLINE_SECONDS):
+        self.expires = time.monotonic() + seconds
+
+    def remaining(self):
+        return max(0.0, self.expires - time.monotonic())
+
+    def statement_timeout_ms(self):
+        """Remaining budget as a Postgres statement_timeout (0 would mean no limit)"""
+        return max(1, int(self.remaining() * 1000))
+
+
+def _lock_path(kind, index):
+    return os.path.join(ADMISSION_DIR, f'{kind}-{index}.lock')
+
+
+def _try_lock(path):
+    f = open(path, 'a')
+    try:
+        fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return f
+    except BlockingIOError:
+        f.close()
+        return None
+
+
+def _try_any(kind, count):
+    for index in range(count):
+        handle = _try_lock(_lock_path(kind, index))
+        if handle is not None:
+            return handle
+    return None
+
+
+def _count_held(kind, count):
+    """Probe how many lock files are held (a brief probe may race a real acquirer)"""
+    held = 0
+    for index in range(count):
+        handle = _try_lock(_lock_path(kind, index))
+        if handle is None:
+            held += 1
+        else:
+            handle.close()
+    return held
+
+
+def record_event(name):
+    """Increment one persistent counter"""
+    path = os.path.join(ADMISSION_DIR, 'counters.json')
+    try:
+        with open(os.path.join(ADMISSION_DIR, 'counters.lock'), 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            counters = load_counters()
+            counters[name] = counters.get(name, 0) + 1
+            tmp_path = f'{path}.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(counters, f)
+            os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"⚠️ Admission counter update failed: {e}", file=sys.stderr)
+
+
+def load_counters():
+    try:
+        with open(os.path.join(ADMISSION_DIR, 'counters.json'), 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {name: 0 for name in COUNTERS}
+
+
+@contextlib.contextmanager
+def admit(deadline):
+    """Hold a concurrency slot for the body, queueing (bounded) until ``deadline``
+
+    Raises Overloaded when the request should be shed.
+    """
+    os.makedirs(ADMISSION_DIR, exist_ok=True)
+    slot = _try_any('slot', MAX_CONCURRENT)
+    if slot is None:
+        ticket = _try_any('queue', MAX_QUEUE)
+        if ticket is None:
+            record_event('shed_queue_full')
+            raise Overloaded('shed_queue_full')
+        record_event('queued')
+        try:
+            delay = POLL_SECONDS
+            while slot is None:
+                if deadline.remaining() < MIN_WORK_SECONDS:
+                    record_event('shed_deadline')
+                    raise Overloaded('shed_deadline')
+                time.sleep(delay)
+                delay = min(delay * 2, MAX_POLL_SECONDS)
+                slot = _try_any('slot', MAX_CONCURRENT)
+        finally:
+            ticket.close()
+
+    try:
+        record_event('admitted')
+        yield
+    finally:
+        slot.close()
+
+
+def admission_stats():
+    """Current load and lifetime counters"""
+    os.makedirs(ADMISSION_DIR, exist_ok=True)
+    return {
+        'in_flight': _count_held('slot', MAX_CONCURRENT),
+        'max_concurrent': MAX_CONCURRENT,
+        'queue_depth': _count_held('queue', MAX_QUEUE),
+        'max_queue': MAX_QUEUE,
+        'counters': load_counters()
+    }
+
+
+def _result_path(kind, user_id):
+    return os.path.join(RESULT_CACHE_DIR, f'{kind}_{int(user_id)}.json')
+
+
+def save_cached_result(kind, user_id, result):
+    """Keep the last good result per user to answer shed requests"""
+    try:
+        os.makedirs(RESULT_CACHE_DIR, exist_ok=True)
+        path = _result_path(kind, user_id)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'cached_at': time.time(), 'result': result}, f)
+        os.replace(tmp_path, path)
+    except (OSError, TypeError) as e:
+        print(f"⚠️ Result cache write failed: {e}", file=sys.stderr)
+
+
+def degraded_result(kind, user_id, reason, fallback):
+    """The user's last good result, or ``fallback``, marked as degraded"""
+    try:
+        with open(_result_path(kind, user_id), 'r') as f:
+            cached = json.load(f)
+        result = dict(cached['result'], cached_at=cached['cached_at'])
+    except (FileNotFoundError, ValueError, KeyError):
+        result = dict(fallback)
+    result['degraded'] = True
+    result['degraded_reason'] = reason
+    return result
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+FinBridge Eligibility Backtest
+Point-in-time eligibility scores for every user at every past month-end
+
+Transactions are aggregated once into a dense (user, calendar month)
+panel. The nine model features at each month-end come from segmented
+cumulative sums over that panel (expanding, or a trailing window of N
+months), using the same formulas as calculate_financial_features on the
+history up to that month. The whole panel is then scored in one batched
+model call per chunk of users.
+
+Usage:
+    python ml/backtest.py --output backtest.csv [--end YYYY-MM] [--window N] [--outcomes outcomes.csv]
+"""
+
+import argparse
+import sys
+import numpy as np
+import pandas as pd
+import psycopg2
+from sklearn.metrics import roc_auc_score
+
+import inference
+
+# Configuration
+USER_CHUNK_SIZE = 5000
+# The std of a single month is undefined, so the live model cannot score it either
+MIN_HISTORY_MONTHS = 2
+
+
+def monthly_panel(df_transactions, end_month=None):
+    """Dense per-user monthly income and expenses from first activity to ``end_month``
+
+    Returns a dict of equal-length arrays ordered by user then month, with
+    ``start`` holding the index of each row's first user row.
+    """
+    months = df_transactions['date'].to_numpy().astype('datetime64[M]').astype(np.int64)
+    end = months.max() if end_month is None else np.datetime64(end_month, 'M').astype(np.int64)
+    keep = months <= end
+    months = months[keep]
+    user_ids = df_transactions['user_id'].to_numpy(dtype=np.int64)[keep]
+    amounts = df_transactions['amount'].to_numpy(dtype=np.float64)[keep]
+    is_income = (df_transactions['type'] == 'income').to_numpy()[keep]
+
+    users, user_index = np.unique(user_ids, return_inverse=True)
+    first = np.full(len(users), end, dtype=np.int64)
+    np.minimum.at(first, user_index, months)
+    span = end - first + 1
+    offsets = np.concatenate([[0], np.cumsum(span)])
+    n_rows = int(offsets[-1])
+
+    row = offsets[user_index] + (months - first[user_index])
+    start = np.repeat(offsets[:-1], span)
+    return {
+        'user_id': np.repeat(users, span),
+        'month': np.repeat(first, span) + (np.arange(n_rows) - start),
+        'start': start,
+        'income': np.bincount(row, weights=amounts * is_income, minlength=n_rows),
+        'expenses': np.bincount(row, weights=amounts * ~is_income, minlength=n_rows),
+        'active': np.bincount(row, minlength=n_rows) > 0
+    }
+
+
+def window_sums(values, start, window=None):
+    """Per-row sum of ``values`` over the user's rows so far, or the last ``window`` of them"""
+    cumulative = np.concatenate([[0.0], np.cumsum(values, dtype=np.float64)])
+    end = np.arange(1, len(values) + 1)
+    low = start if window is None else np.maximum(start, end - window)
+    return cumulative[end] - cumulative[low]
+
+
+def point_in_time_features(panel, window=None):
+    """The nine model features at every panel month-end, as columns"""
+    start = panel['start']
+    active = panel['active'].astype(np.float64)
+    income = panel['income']
+    expenses = panel['expenses']
+
+    n_months = window_sums(active, start, window)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        avg_monthly_income = window_sums(income, start, window) / n_months
+        avg_monthly_expenses = window_sums(expenses, start, window) / n_months
+
+        # Sample std from centred sums; centring on the user's overall mean keeps the
+        # cumulative sums of squares small enough to difference accurately
+        user_rows = np.bincount(start, weights=active)[start]
+        user_mean = np.bincount(start, weights=income * active)[start] / user_rows
+        centred = (income - user_mean) * active
+        s1 = window_sums(centred, start, window)
+        s2 = window_sums(centred ** 2, start, window)
+        income_std = np.sqrt(np.maximum(s2 - s1 ** 2 / n_months, 0) / (n_months - 1))
+
+        income_stability = np.where(avg_monthly_income > 0,
+                                    np.clip(1 - income_std / avg_monthly_income, 0, 1), 0)
+        expense_to_income_ratio = np.where(avg_monthly_income > 0,
+                                           np.clip(avg_monthly_expenses / avg_monthly_income, 0, 1), 1)
+        positive_months = window_sums(active * (income - expenses > 0), start, window)
+        cashflow_consistency = positive_months / n_months
+
+    has_credit_history = (n_months >= 6).astype(np.int64)
+    return {
+        'avg_monthly_income': avg_monthly_income,
+        'income_stability': income_stability,
+        'expense_to_income_ratio': expense_to_income_ratio,
+        'emi_to_income_ratio': np.full(len(start), 0.2),
+        'cashflow_consistency': cashflow_consistency,
+        'months_history': n_months.astype(np.int64),
+        'has_credit_history': has_credit_history,
+        'credit_score': np.where(has_credit_history == 1, 650 + income_stability * 200, 0),
+        'business_age_years': n_months / 12
+    }
+
+
+def backtest_transactions(df_transactions, model, scaler, metadata, end_month=None, window=None):
+    """Score every (user, month-end) of a transaction frame with one model call
+
+    Returns a compact table: user_id, month_end, months_history,
+    default_probability and eligibility_score.
+    """
+    if df_transactions.empty:
+        return pd.DataFrame(columns=['user_id', 'month_end', 'months_history',
+                                     'default_probability', 'eligibility_score'])
+
+    panel = monthly_panel(df_transactions, end_month)
+    features = point_in_time_features(panel, window)
+    scorable = features['months_history'] >= MIN_HISTORY_MONTHS
+
+    X = np.column_stack([features[column][scorable] for column in metadata['feature_columns']])
+    probabilities = inference.predict_default_matrix(X, model, scaler, metadata) if len(X) else np.empty(0)
+
+    month_start = panel['month'][scorable].astype('datetime64[M]')
+    return pd.DataFrame({
+        'user_id': panel['user_id'][scorable].astype(np.int32),
+        'month_end': (month_start + 1).astype('datetime64[D]') - 1,
+        'months_history': features['months_history'][scorable].astype(np.int16),
+        'default_probability': probabilities.astype(np.float32),
+        # Same truncation as score_features: int((1 - p) * 100)
+        'eligibility_score': np.clip(np.floor((1 - probabilities) * 100), 0, 100).astype(np.int8)
+    })
+
+
+def run_backtest(conn, artifacts, user_ids=None, end_month=None, window=None, chunk_size=USER_CHUNK_SIZE):
+    """Backtest users in chunks; each chunk is one transaction fetch and one model call"""
+    if user_ids is None:
+        cursor = conn.cursor()
+        cursor.execute('SELECT id FROM users ORDER BY id')
+        user_ids = [row[0] for row in cursor.fetchall()]
+        cursor.close()
+
+    tables = []
+    for i in range(0, len(user_ids), chunk_size):
+        df_transactions = inference.get_users_transactions(user_ids[i:i + chunk_size], conn)
+        tables.append(backtest_transactions(df_transactions, *artifacts, end_month=end_month, window=window))
+    return pd.concat(tables, ignore_index=True) if tables else backtest_transactions(pd.DataFrame(), *artifacts)
+
+
+def auc_by_month(backtest, outcomes):
+    """ROC-AUC of the month-end scores against per-user outcomes (user_id, default)
+
+    Months whose scored users are all one class have no AUC.
+    """
+    merged = backtest.merge(outcomes[['user_id', 'default']], on='user_id')
+    rows = []
+    for month_end, group in merged.groupby('month_end', sort=True):
+        labels = group['default'].to_numpy()
+        has_both = 0 < labels.sum() < len(labels)
+        rows.append({
+            'month_end': month_end,
+            'n_users': len(group),
+            'default_rate': labels.mean(),
+            'auc': roc_auc_score(labels, group['default_probability']) if has_both else np.nan
+        })
+    return pd.DataFrame(rows, columns=['month_end', 'n_users', 'default_rate', 'auc'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Point-in-time eligibility backtest')
+    parser.add_argument('--output', required=True, help='CSV path for the (user, month-end) score table')
+    parser.add_argument('--users', help='comma-separated user ids (default: all users)')
+    parser.add_argument('--end', help='last month-end to score, YYYY-MM (default: latest transaction month)')
+    parser.add_argument('--window', type=int, help='trailing window in months (default: full history)')
+    parser.add_argument('--outcomes', help='CSV of user_id,default to report AUC by month')
+    parser.add_argument('--chunk-size', type=int, default=USER_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    user_ids = [int(u) for u in args.users.split(',')] if args.users else None
+    artifacts = inference.load_model_artifacts()
+    conn = psycopg2.connect(**inference.DB_CONFIG)
+    try:
+        backtest = run_backtest(conn, artifacts, user_ids, args.end, args.window, args.chunk_size)
+    finally:
+        conn.close()
+
+    backtest.to_csv(args.output, index=False)
+    print(f"✓ {len(backtest)} month-end scores for {backtest['user_id'].nunique()} users saved to {args.output}",
+          file=sys.stderr)
+
+    if args.outcomes:
+        print(auc_by_month(backtest, pd.read_csv(args.outcomes)).to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,364 @@
+#!/usr/bin/env python3
+"""
+FinBridge Chatbot Benchmark
+Measures cold start, per-message latency and throughput of the NLP chatbot
+
+Runs fully offline: the saved lemma table is used when present, otherwise
+lemmatization is skipped, so no NLTK data is ever downloaded. Cold start
+is measured as fresh `chatbot_nlp.py predict` processes, exactly as the
+backend runs them; those need the lemma table to stay offline, so cold
+start and CLI latency are skipped without it.
+
+Usage:
+    python ml/benchmark_chatbot.py [--messages N] [--cold-starts N] [--intent-scales 16,64,256]
+                                   [--replay requests.jsonl] [--output results.json]
+                                   [--compare baseline.json]
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import numpy as np
+
+from chatbot_nlp import FinancialChatbot
+from chatbot_hashing import HashedIntentClassifier, HASHED_MODEL_PATH
+from chatbot_preprocessing import TextPreprocessor, LEMMA_TABLE_PATH
+
+# Configuration
+RANDOM_STATE = 42
+N_MESSAGES = 2000
+N_CLI_MESSAGES = 20
+N_COLD_STARTS = 5
+INTENT_SCALES = (16, 64, 256)
+REGRESSION_TOLERANCE = 0.2
+WORKLOAD_MIX = {'pattern': 0.3, 'paraphrase': 0.3, 'typo': 0.25, 'long': 0.1, 'replay': 0.05}
+
+PREFIXES = ["", "please ", "can you ", "hey, ", "i want to know ", "could you tell me ", "quick question: "]
+SUFFIXES = ["", "?", " please", " now", " for this month", "??", " thanks"]
+FILLER = (
+    "so i have been running my shop for a few years now and business has been okay "
+    "but some months are slower than others and i am trying to plan ahead for the "
+    "festival season when i usually need to buy more stock than usual"
+).split()
+SYNTHETIC_WORDS = (
+    "account balance wallet deposit withdraw transfer upi gst invoice vendor supplier "
+    "stock inventory rent salary bonus tax refund insurance premium policy claim "
+    "overdraft limit branch statement cheque mandate subsidy scheme repayment penalty"
+).split()
+
+
+def percentiles(samples_ms):
+    """Summarize latency samples in milliseconds"""
+    samples = np.asarray(samples_ms)
+    return {
+        'count': int(len(samples)),
+        'mean_ms': float(samples.mean()),
+        'p50_ms': float(np.percentile(samples, 50)),
+        'p95_ms': float(np.percentile(samples, 95)),
+        'p99_ms': float(np.percentile(samples, 99)),
+        'max_ms': float(samples.max())
+    }
+
+
+def add_typo(text, rng):
+    """Apply one random character-level edit (drop, swap, duplicate, replace)"""
+    if len(text) < 3:
+        return text
+    i = rng.randrange(len(text) - 1)
+    edit = rng.choice(['drop', 'swap', 'duplicate', 'replace'])
+    if edit == 'drop':
+        return text[:i] + text[i + 1:]
+    if edit == 'swap':
+        return text[:i] + text[i + 1] + text[i] + text[i + 2:]
+    if edit == 'duplicate':
+        return text[:i] + text[i] + text[i:]
+    return text[:i] + rng.choice('abcdefghijklmnopqrstuvwxyz') + text[i + 1:]
+
+
+def load_replay(path):
+    """Load replay messages from a JSONL file or a plain text file (one per line)
+
+    JSON records may carry ``message``, or ``title``/``body`` as in
+    requests.jsonl.
+    """
+    messages = []
+    with open(path, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                messages.append(line)
+                continue
+            if isinstance(record, dict):
+                for key in ('message', 'title', 'body'):
+                    if record.get(key):
+                        messages.append(str(record[key]))
+            else:
+                messages.append(str(record))
+    return messages
+
+
+def generate_workload(intents, n_messages, replay_messages=(), mix=WORKLOAD_MIX, seed=RANDOM_STATE):
+    """Generate a realistic mix of chat messages and their workload kinds"""
+    rng = random.Random(seed)
+    patterns = [p for intent in intents['intents'] for p in intent['patterns']]
+    kinds = list(mix)
+    weights = [mix[k] if (k != 'replay' or replay_messages) else 0 for k in kinds]
+
+    workload = []
+    for _ in range(n_messages):
+        kind = rng.choices(kinds, weights=weights)[0]
+        pattern = rng.choice(patterns)
+        if kind == 'pattern':
+            message = pattern
+        elif kind == 'paraphrase':
+            message = rng.choice(PREFIXES) + pattern.lower() + rng.choice(SUFFIXES)
+        elif kind == 'typo':
+            message = add_typo(rng.choice(PREFIXES) + pattern.lower(), rng)
+        elif kind == 'long':
+            start = rng.randrange(len(FILLER) // 2)
+            message = ' '.join(FILLER[start:start + rng.randint(15, 40)]) + ', ' + pattern.lower()
+        else:
+            message = rng.choice(replay_messages)
+        workload.append((kind, message))
+    return workload
+
+
+def synthetic_intents(base_intents, n_intents, seed=RANDOM_STATE):
+    """Pad the real intents with synthetic ones to study scaling"""
+    rng = random.Random(seed)
+    intents = [dict(intent) for intent in base_intents['intents']]
+    for i in range(len(intents), n_intents):
+        patterns = [
+            ' '.join(rng.sample(SYNTHETIC_WORDS, rng.randint(2, 5)))
+            for _ in range(rng.randint(8, 12))
+        ]
+        intents.append({
+            'tag': f'synthetic_{i}',
+            'patterns': patterns,
+            'responses': [f'Synthetic response {i}']
+        })
+    return {'intents': intents[:max(n_intents, len(base_intents['intents']))]}
+
+
+def make_chatbot(intents=None, load=False):
+    """Build an offline chatbot; lemmatization falls back to pass-through"""
+    chatbot = FinancialChatbot(feedback_logging=False)
+    if load:
+        # Keep status messages out of the JSON written to stdout
+        with contextlib.redirect_stdout(sys.stderr):
+            chatbot.load_model()
+    if chatbot.preprocessor.uses_wordnet:
+        chatbot.preprocessor = TextPreprocessor(lemma_table={})
+    if intents is not None:
+        chatbot.intents = intents
+        chatbot.intents_by_tag = {intent['tag']: intent for intent in intents['intents']}
+        chatbot.pattern_index = None
+    return chatbot
+
+
+def fit_compact_model(chatbot):
+    """Train the compact classifier on the chatbot's current intents"""
+    texts, labels = [], []
+    for intent in chatbot.intents['intents']:
+        for pattern in intent['patterns']:
+            texts.append(chatbot.preprocess_text(pattern))
+            labels.append(intent['tag'])
+    chatbot.model = HashedIntentClassifier.fit(texts, labels)
+    return len(texts)
+
+
+def bench_in_process(chatbot, workload):
+    """Per-message latency of get_response and batch classifier throughput"""
+    latencies = []
+    by_kind = {}
+    for kind, message in workload:
+        start = time.perf_counter()
+        chatbot.get_response(message)
+        elapsed = (time.perf_counter() - start) * 1000
+        latencies.append(elapsed)
+        by_kind.setdefault(kind, []).append(elapsed)
+
+    messages = [message for _, message in workload]
+    start = time.perf_counter()
+    processed = [chatbot.preprocess_text(message) for message in messages]
+    chatbot.model.predict_proba(processed)
+    batch_seconds = time.perf_counter() - start
+
+    return {
+        'latency': percentiles(latencies),
+        'latency_by_kind': {kind: percentiles(samples) for kind, samples in sorted(by_kind.items())},
+        'messages_per_second': len(latencies) / (sum(latencies) / 1000),
+        'batch_messages_per_second': len(messages) / batch_seconds,
+        'fast_path': chatbot.fast_path_stats(),
+        'preprocess_cache': chatbot.preprocessor.cache_info()
+    }
+
+
+def run_predict_cli(message):
+    """Answer one message with a fresh `chatbot_nlp.py predict` process; returns milliseconds"""
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'chatbot_nlp.py')
+    env = dict(os.environ, CHATBOT_FEEDBACK_LOG='0')
+    start = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, script, 'predict', message],
+        capture_output=True, text=True, env=env
+    )
+    elapsed = (time.perf_counter() - start) * 1000
+    if completed.returncode != 0:
+        raise RuntimeError(f'predict CLI failed: {completed.stderr.strip()}')
+    # The result is the last stdout line; earlier lines are status messages
+    json.loads(completed.stdout.strip().splitlines()[-1])
+    return elapsed
+
+
+def bench_cold_start(n_runs=N_COLD_STARTS):
+    """Time from process start to the first answer, as the backend sees it
+
+    Every run is a new interpreter, so imports, artifact loading and the
+    first prediction are all included. The in-process model load is kept
+    alongside for diagnosis only.
+    """
+    runs = [run_predict_cli('Hello') for _ in range(n_runs)]
+
+    start = time.perf_counter()
+    chatbot = make_chatbot(load=True)
+    return {
+        'runs': n_runs,
+        'first_response_ms': float(np.median(runs)),
+        'min_ms': min(runs),
+        'max_ms': max(runs),
+        'in_process_load_ms': (time.perf_counter() - start) * 1000,
+        'model_type': type(chatbot.model).__name__
+    }
+
+
+def bench_cli(workload, n_messages):
+    """Latency of the `chatbot_nlp.py predict` path the backend shells out to"""
+    latencies = [run_predict_cli(message) for _, message in workload[:n_messages]]
+    return {
+        'latency': percentiles(latencies),
+        'messages_per_second': len(latencies) / (sum(latencies) / 1000)
+    }
+
+
+def compare_results(current, baseline, tolerance=REGRESSION_TOLERANCE):
+    """List metrics that regressed by more than ``tolerance`` against a baseline"""
+    regressions = []
+
+    def check(name, new, old, higher_is_better):
+        if not old:
+            return
+        change = (new - old) / old
+        if (change < -tolerance) if higher_is_better else (change > tolerance):
+            regressions.append({'metric': name, 'baseline': old, 'current': new, 'change': change})
+
+    check('in_process.p50_ms', current['in_process']['latency']['p50_ms'],
+          baseline['in_process']['latency']['p50_ms'], False)
+    check('in_process.p99_ms', current['in_process']['latency']['p99_ms'],
+          baseline['in_process']['latency']['p99_ms'], False)
+    check('in_process.batch_messages_per_second', current['in_process']['batch_messages_per_second'],
+          baseline['in_process']['batch_messages_per_second'], True)
+    if current.get('cold_start') and baseline.get('cold_start'):
+        check('cold_start.first_response_ms', current['cold_start']['first_response_ms'],
+              baseline['cold_start']['first_response_ms'], False)
+    if current.get('cli') and baseline.get('cli'):
+        check('cli.p50_ms', current['cli']['latency']['p50_ms'], baseline['cli']['latency']['p50_ms'], False)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the FinBridge NLP chatbot')
+    parser.add_argument('--messages', type=int, default=N_MESSAGES)
+    parser.add_argument('--cli-messages', type=int, default=N_CLI_MESSAGES,
+                        help='messages sent through the predict CLI (0 to skip)')
+    parser.add_argument('--cold-starts', type=int, default=N_COLD_STARTS,
+                        help='fresh predict processes timed for cold start (0 to skip)')
+    parser.add_argument('--intent-scales', default=','.join(str(n) for n in INTENT_SCALES))
+    parser.add_argument('--replay', action='append', default=[], help='JSONL or text file of messages')
+    parser.add_argument('--seed', type=int, default=RANDOM_STATE)
+    parser.add_argument('--output', help='write results JSON here instead of stdout')
+    parser.add_argument('--compare', help='baseline results JSON to check for regressions')
+    args = parser.parse_args()
+
+    if not (os.path.exists(HASHED_MODEL_PATH) or os.path.exists('ml/models/chatbot_model.pkl')):
+        print("⚠️ No trained chatbot model found. Run: python ml/chatbot_nlp.py", file=sys.stderr)
+        sys.exit(1)
+
+    replay_messages = [m for path in args.replay for m in load_replay(path)]
+    lemma_table_present = os.path.exists(LEMMA_TABLE_PATH)
+
+    # Predict processes load WordNet without a lemma table, so they only run offline with one
+    if not lemma_table_present and (args.cold_starts or args.cli_messages):
+        print(f"⚠️ No lemma table at {LEMMA_TABLE_PATH}; skipping cold start and CLI latency",
+              file=sys.stderr)
+
+    # Cold start first, before this process warms the page cache further
+    cold_start = bench_cold_start(args.cold_starts) if args.cold_starts and lemma_table_present else None
+
+    chatbot = make_chatbot(load=True)
+    workload = generate_workload(chatbot.intents, args.messages, replay_messages, seed=args.seed)
+    results = {
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'numpy': np.__version__,
+            'lemma_table': lemma_table_present,
+            'compact_model': os.path.exists(HASHED_MODEL_PATH)
+        },
+        'workload': {
+            'messages': len(workload),
+            'replay_messages': len(replay_messages),
+            'seed': args.seed
+        },
+        'cold_start': cold_start,
+        'in_process': bench_in_process(chatbot, workload)
+    }
+
+    # Degradation as the number of intents grows
+    scaling = []
+    for n_intents in [int(n) for n in args.intent_scales.split(',') if n]:
+        scaled = make_chatbot(synthetic_intents(chatbot.intents, n_intents, seed=args.seed))
+        start = time.perf_counter()
+        n_patterns = fit_compact_model(scaled)
+        train_ms = (time.perf_counter() - start) * 1000
+        scaled_workload = generate_workload(scaled.intents, args.messages, replay_messages, seed=args.seed)
+        result = bench_in_process(scaled, scaled_workload)
+        scaling.append({
+            'intents': len(scaled.intents['intents']),
+            'patterns': n_patterns,
+            'train_ms': train_ms,
+            'latency': result['latency'],
+            'batch_messages_per_second': result['batch_messages_per_second']
+        })
+    results['intent_scaling'] = scaling
+
+    results['cli'] = bench_cli(workload, args.cli_messages) if args.cli_messages and lemma_table_present else None
+
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            results['regressions'] = compare_results(results, json.load(f))
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+        print(f"✅ Benchmark results saved to {args.output}")
+    else:
+        print(output)
+
+    if results.get('regressions'):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+FinBridge Compact Intent Classifier
+Hashing-vectorizer TF-IDF + Naive Bayes stored as dense arrays in an .npz
+"""
+
+import os
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.special import logsumexp
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.naive_bayes import MultinomialNB
+from sklearn.preprocessing import normalize
+
+# Configuration
+HASHED_MODEL_PATH = 'ml/models/chatbot_model.npz'
+N_HASH_FEATURES = 2 ** 22
+NGRAM_RANGE = (1, 2)
+MAX_FEATURES = 1000
+ALPHA = 0.1
+
+
+def make_vectorizer(ngram_range=NGRAM_RANGE, n_hash_features=N_HASH_FEATURES):
+    """Stateless term counter with the same analyzer as TfidfVectorizer"""
+    return HashingVectorizer(
+        ngram_range=tuple(ngram_range),
+        n_features=n_hash_features,
+        alternate_sign=False,
+        norm=None
+    )
+
+
+class HashedIntentClassifier:
+    """TF-IDF + MultinomialNB intent classifier without a pickled vocabulary
+
+    Only the hashed columns seen during training are kept ("active"
+    columns), so the stored arrays stay as small as the TF-IDF vocabulary
+    and unseen terms are dropped at prediction time exactly like
+    out-of-vocabulary terms are dropped by TfidfVectorizer.
+
+    The Naive Bayes sufficient statistics are kept alongside the log
+    probabilities so ``partial_fit`` can fold in new examples at a cost
+    proportional to the batch. IDF weights of existing columns are frozen
+    at training time; a column first seen online gets its IDF from the
+    document counts at that point.
+    """
+
+    def __init__(self, columns, idf, feature_count, class_count, classes, df, n_docs,
+                 alpha=ALPHA, ngram_range=NGRAM_RANGE, n_hash_features=N_HASH_FEATURES, version=1):
+        self.classes_ = np.asarray(classes)
+        self.alpha = float(alpha)
+        self.n_docs = int(n_docs)
+        self.version = int(version)
+        self.ngram_range = tuple(int(n) for n in ngram_range)
+        self.n_hash_features = int(n_hash_features)
+        self.vectorizer = make_vectorizer(self.ngram_range, self.n_hash_features)
+        self.class_index = {label: i for i, label in enumerate(self.classes_.tolist())}
+
+        # Column arrays are over-allocated so appending new terms is amortized O(1)
+        self.n_active = len(columns)
+        capacity = max(self.n_active, 16)
+        self._columns = np.zeros(capacity, dtype=np.int64)
+        self._idf = np.zeros(capacity, dtype=np.float64)
+        self._df = np.zeros(capacity, dtype=np.int64)
+        self._feature_count = np.zeros((len(self.classes_), capacity), dtype=np.float64)
+        self._columns[:self.n_active] = columns
+        self._idf[:self.n_active] = idf
+        self._df[:self.n_active] = df
+        self._feature_count[:, :self.n_active] = feature_count
+        self.column_positions = {int(c): i for i, c in enumerate(columns)}
+
+        self.class_count = np.asarray(class_count, dtype=np.float64).copy()
+        self.class_feature_total = self._feature_count.sum(axis=1)
+        self._log_numerator = np.log(self._feature_count + self.alpha)
+
+    @property
+    def columns(self):
+        return self._columns[:self.n_active]
+
+    @property
+    def idf(self):
+        return self._idf[:self.n_active]
+
+    @property
+    def df(self):
+        return self._df[:self.n_active]
+
+    @property
+    def feature_count(self):
+        return self._feature_count[:, :self.n_active]
+
+    @property
+    def class_log_prior(self):
+        return np.log(self.class_count) - np.log(self.class_count.sum())
+
+    @property
+    def class_log_denominator(self):
+        return np.log(self.class_feature_total + self.alpha * self.n_active)
+
+    @property
+    def feature_log_prob(self):
+        return self._log_numerator[:, :self.n_active] - self.class_log_denominator[:, None]
+
+    @classmethod
+    def fit(cls, texts, labels, ngram_range=NGRAM_RANGE, max_features=MAX_FEATURES,
+            alpha=ALPHA, n_hash_features=N_HASH_FEATURES):
+        """Train on preprocessed texts"""
+        vectorizer = make_vectorizer(ngram_range, n_hash_features)
+        counts = vectorizer.transform(texts).tocsc()
+
+        # Active columns, limited to the most frequent terms like max_features
+        df = np.diff(counts.indptr)
+        columns = np.flatnonzero(df)
+
+        analyzer = vectorizer.build_analyzer()
+        n_terms = len(set(term for text in texts for term in analyzer(text)))
+        if n_terms > len(columns):
+            print(f"⚠️ {n_terms - len(columns)} hashed term collisions; consider more hash features")
+
+        if max_features is not None and len(columns) > max_features:
+            term_counts = np.asarray(counts[:, columns].sum(axis=0)).ravel()
+            keep = np.argsort(-term_counts, kind='stable')[:max_features]
+            columns = np.sort(columns[keep])
+
+        # Smoothed IDF, as computed by TfidfVectorizer defaults
+        n_docs = counts.shape[0]
+        idf = np.log((1 + n_docs) / (1 + df[columns])) + 1
+
+        X = normalize(counts[:, columns].tocsr().multiply(idf).tocsr())
+        nb = MultinomialNB(alpha=alpha)
+        nb.fit(X, labels)
+
+        return cls(columns, idf, nb.feature_count_, nb.class_count_, nb.classes_, df[columns], n_docs,
+                   alpha=alpha, ngram_range=ngram_range, n_hash_features=n_hash_features)
+
+    def _positions(self, counts):
+        """Active positions of the hashed columns in ``counts`` (-1 if unseen)"""
+        positions = self.column_positions
+        return np.fromiter((positions.get(c, -1) for c in counts.indices.tolist()),
+                           dtype=np.int64, count=len(counts.indices))
+
+    def _tfidf(self, counts, positions):
+        known = positions >= 0
+        data = counts.data[known] * self._idf[positions[known]]
+        row_ids = np.repeat(np.arange(counts.shape[0]), np.diff(counts.indptr))[known]
+        indptr = np.concatenate([[0], np.cumsum(np.bincount(row_ids, minlength=counts.shape[0]))])
+        X = csr_matrix((data, positions[known], indptr), shape=(counts.shape[0], self.n_active))
+        return normalize(X)
+
+    def transform(self, texts):
+        """TF-IDF vectors over the active columns, dropping unseen terms"""
+        counts = self.vectorizer.transform(texts)
+        return self._tfidf(counts, self._positions(counts))
+
+    def predict_log_proba(self, texts):
+        X = self.transform(texts)
+        jll = (X @ self._log_numerator[:, :self.n_active].T
+               - np.asarray(X.sum(axis=1)) * self.class_log_denominator
+               + self.class_log_prior)
+        return jll - logsumexp(jll, axis=1, keepdims=True)
+
+    def predict_proba(self, texts):
+        return np.exp(self.predict_log_proba(texts))
+
+    def predict(self, texts):
+        return self.classes_[np.argmax(self.predict_log_proba(texts), axis=1)]
+
+    def _add_columns(self, new_columns, new_df):
+        """Append previously unseen hashed columns"""
+        needed = self.n_active + len(new_columns)
+        if needed > len(self._columns):
+            capacity = max(needed, 2 * len(self._columns))
+            grow = capacity - len(self._columns)
+            self._columns = np.concatenate([self._columns, np.zeros(grow, dtype=np.int64)])
+            self._idf = np.concatenate([self._idf, np.zeros(grow)])
+            self._df = np.concatenate([self._df, np.zeros(grow, dtype=np.int64)])
+            self._feature_count = np.hstack([self._feature_count, np.zeros((len(self.classes_), grow))])
+            self._log_numerator = np.hstack([self._log_numerator, np.full((len(self.classes_), grow), np.log(self.alpha))])
+
+        span = slice(self.n_active, needed)
+        self._columns[span] = new_columns
+        self._idf[span] = np.log((1 + self.n_docs) / (1 + new_df)) + 1
+        for i, column in enumerate(new_columns.tolist()):
+            self.column_positions[column] = self.n_active + i
+        self.n_active = needed
+
+    def partial_fit(self, texts, labels):
+        """Fold a batch of labeled, preprocessed texts into the model in place"""
+        unknown = set(labels) - set(self.class_index)
+        if unknown:
+            raise ValueError(f"Unknown intent labels: {sorted(unknown)}")
+
+        counts = self.vectorizer.transform(texts)
+        self.n_docs += counts.shape[0]
+
+        # Register unseen terms, then account the batch document frequencies
+        seen = np.unique(counts.indices)
+        batch_df = np.asarray((counts[:, seen] > 0).sum(axis=0)).ravel()
+        is_new = np.array([c not in self.column_positions for c in seen.tolist()], dtype=bool)
+        if is_new.any():
+            self._add_columns(seen[is_new], batch_df[is_new])
+        touched = np.array([self.column_positions[c] for c in seen.tolist()], dtype=np.int64)
+        self._df[touched] += batch_df
+
+        # Naive Bayes sufficient statistics, restricted to the touched columns
+        X = self._tfidf(counts, self._positions(counts))
+        Y = np.zeros((len(labels), len(self.classes_)))
+        Y[np.arange(len(labels)), [self.class_index[label] for label in labels]] = 1
+        delta = np.asarray((X[:, touched].T @ Y).T)
+
+        self._feature_count[:, touched] += delta
+        self.class_feature_total += delta.sum(axis=1)
+        self.class_count += Y.sum(axis=0)
+        self._log_numerator[:, touched] = np.log(self._feature_count[:, touched] + self.alpha)
+        self.version += 1
+        return self
+
+    def save(self, path=HASHED_MODEL_PATH):
+        """Atomically write the classifier arrays to an uncompressed .npz"""
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.savez(
+                f,
+                columns=self.columns,
+                idf=self.idf,
+                df=self.df,
+                n_docs=np.array(self.n_docs),
+                class_log_prior=self.class_log_prior,
+                feature_log_prob=self.feature_log_prob,
+                feature_count=self.feature_count,
+                class_count=self.class_count,
+                classes=self.classes_.astype(str),
+                alpha=np.array(self.alpha),
+                ngram_range=np.array(self.ngram_range),
+                n_hash_features=np.array(self.n_hash_features),
+                version=np.array(self.version)
+            )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path=HASHED_MODEL_PATH):
+        """Load the classifier arrays; no pickle involved"""
+        with np.load(path, allow_pickle=False) as artifact:
+            return cls(
+                artifact['columns'],
+                artifact['idf'],
+                artifact['feature_count'],
+                artifact['class_count'],
+                artifact['classes'],
+                artifact['df'],
+                artifact['n_docs'],
+                alpha=artifact['alpha'],
+                ngram_range=artifact['ngram_range'],
+                n_hash_features=artifact['n_hash_features'],
+                version=artifact['version']
+            )
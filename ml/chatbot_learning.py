@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+FinBridge Chatbot Online Learning
+Append-only feedback log and incremental updates of the compact intent model
+"""
+
+import fcntl
+import json
+import os
+import sys
+import time
+from chatbot_hashing import HASHED_MODEL_PATH
+
+# Configuration
+FEEDBACK_LOG_PATH = 'ml/models/chatbot_feedback.jsonl'
+LEARNING_STATE_PATH = 'ml/models/chatbot_learning_state.json'
+LEARNING_LOCK_PATH = 'ml/models/chatbot_learning.lock'
+LOW_CONFIDENCE_THRESHOLD = 0.3
+
+
+def log_feedback(message, predicted, confidence, label=None, source='low_confidence',
+                 path=FEEDBACK_LOG_PATH):
+    """Append one feedback record; labeled records are used for learning"""
+    record = {
+        'timestamp': time.time(),
+        'message': message,
+        'predicted': predicted,
+        'confidence': confidence,
+        'label': label,
+        'source': source
+    }
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # One write per record on an O_APPEND file keeps concurrent writers from interleaving
+    with open(path, 'a') as f:
+        f.write(json.dumps(record) + '\n')
+
+
+def load_learning_state(path=LEARNING_STATE_PATH):
+    """Return how far into the feedback log the model has already learned"""
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {'offset': 0, 'examples_learned': 0, 'model_version': None}
+
+
+def save_learning_state(state, path=LEARNING_STATE_PATH):
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def read_feedback(offset=0, path=FEEDBACK_LOG_PATH):
+    """Read complete feedback records written after ``offset`` bytes
+
+    Returns the records and the offset just past the last complete line,
+    so a record still being written is picked up on the next run.
+    """
+    records = []
+    try:
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break
+                offset += len(line)
+                if line.strip():
+                    records.append(json.loads(line))
+    except FileNotFoundError:
+        pass
+    return records, offset
+
+
+def labeled_examples(records, known_tags):
+    """Feedback records whose label is a known intent tag"""
+    examples = [r for r in records if r.get('label') in known_tags]
+    skipped = sum(1 for r in records if r.get('label') is not None) - len(examples)
+    if skipped:
+        print(f"⚠️ Skipped {skipped} feedback records with unknown intent labels", file=sys.stderr)
+    return examples
+
+
+def learn_from_feedback(chatbot, model_path=HASHED_MODEL_PATH):
+    """Apply new labeled feedback to the compact model and publish a new version
+
+    Only the part of the log written since the previous run is read, so the
+    cost is proportional to the new examples rather than the full history.
+    """
+    if not hasattr(chatbot.model, 'partial_fit'):
+        raise RuntimeError('Online learning needs the compact chatbot model (chatbot_model.npz)')
+
+    with open(LEARNING_LOCK_PATH, 'w') as lock:
+        # Serialize learners so no feedback record is applied twice
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        chatbot.refresh_model()
+
+        state = load_learning_state()
+        records, offset = read_feedback(state['offset'])
+
+        examples = labeled_examples(records, chatbot.intents_by_tag)
+
+        if examples:
+            texts = [chatbot.preprocess_text(r['message']) for r in examples]
+            labels = [r['label'] for r in examples]
+            chatbot.model.partial_fit(texts, labels)
+            chatbot.model.save(model_path)
+            if model_path == HASHED_MODEL_PATH:
+                chatbot.model_mtime = os.stat(model_path).st_mtime_ns
+            state['examples_learned'] += len(examples)
+            state['model_version'] = chatbot.model.version
+
+        state['offset'] = offset
+        save_learning_state(state)
+
+    return {
+        'records_read': len(records),
+        'examples_learned': len(examples),
+        'model_version': state['model_version']
+    }
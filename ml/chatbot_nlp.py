@@ -4,45 +4,379 @@ FinBridge NLP-Powered Chatbot
 Uses NLTK and machine learning for natural language understanding
 """
 
+import contextlib
+import fcntl
 import json
 import pickle
 import random
+import re
+import sys
 import numpy as np
-import nltk
-from nltk.stem import WordNetLemmatizer
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.naive_bayes import MultinomialNB
 from sklearn.pipeline import Pipeline
 import os
+from chatbot_preprocessing import TextPreprocessor, save_lemma_table
+from chatbot_hashing import HashedIntentClassifier, HASHED_MODEL_PATH
+from chatbot_learning import (LEARNING_LOCK_PATH, LOW_CONFIDENCE_THRESHOLD, labeled_examples, learn_from_feedback,
+                               load_learning_state, log_feedback, read_feedback, save_learning_state)
+from emi_engine import (DEFAULT_ANNUAL_RATE, DEFAULT_TENURE_MONTHS, MAX_ANNUAL_RATE, MAX_PRINCIPAL,
+                        MAX_TENURE_MONTHS, MIN_TENURE_MONTHS, QuoteGridCache, emi,
+                        first_installment_split, max_principal)
 
-# Download required NLTK data
-try:
-    nltk.data.find('tokenizers/punkt')
-except LookupError:
-    nltk.download('punkt')
+FEATURE_CACHE_DIR = 'ml/models/cache'
+PREDICT_STATS_PATH = 'ml/models/chatbot_stats.json'
+PREDICT_STATS_LOCK_PATH = 'ml/models/chatbot_stats.lock'
+# Share of monthly income that can comfortably go to a new EMI
+AFFORDABLE_EMI_SHARE = 0.4
+TENURE_PATTERN = re.compile(r'(\d+)\s*(months?|mos?|years?|yrs?)\b', re.IGNORECASE)
+RATE_PATTERN = re.compile(r'(\d+(?:\.\d+)?)\s*%')
+# Longer numbers are out of range anyway; checked before int() so huge inputs stay cheap
+MAX_NUMBER_DIGITS = 12
+AMOUNT_PATTERN = re.compile(r'\d[\d,]*')
 
-try:
-    nltk.data.find('tokenizers/punkt_tab')
-except LookupError:
-    nltk.download('punkt_tab')
-    
-try:
-    nltk.data.find('corpora/wordnet')
-except LookupError:
-    nltk.download('wordnet')
+def load_predict_stats(path=PREDICT_STATS_PATH):
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {'messages': 0, 'fast_path_hits': 0}
 
-try:
-    nltk.data.find('corpora/omw-1.4')
-except LookupError:
-    nltk.download('omw-1.4')
+def record_predict_stats(fast_path, path=PREDICT_STATS_PATH):
+    """Count one answered message across the per-message predict processes"""
+    try:
+        with open(PREDICT_STATS_LOCK_PATH, 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            stats = load_predict_stats(path)
+            stats['messages'] += 1
+            stats['fast_path_hits'] += int(fast_path)
+            tmp_path = f'{path}.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(stats, f)
+            os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"⚠️ Chatbot stats update failed: {e}", file=sys.stderr)
+
+class ActionExecutor:
+    """Resolve chatbot actions from the same monthly features inference.py scores
+
+    Each user's features and scores are cached on disk together with a
+    fingerprint of their transactions (count, max id, amount total) and the
+    eligibility model's training date, so a chat turn costs one cheap
+    aggregate read unless the history changed or the model was retrained.
+    """
+    
+    def __init__(self, cache_dir=FEATURE_CACHE_DIR):
+        self.cache_dir = cache_dir
+        self._memory = {}
+        self._artifacts = None
+        self._loan_matcher = None
+        self.quote_cache = QuoteGridCache()
+        self.executors = {
+            'calculate_affordability': self.calculate_affordability,
+            'calculate_emi': self.calculate_emi,
+            'get_income': self.get_income,
+            'get_expenses': self.get_expenses,
+            'get_savings': self.get_savings,
+            'get_eligibility': self.get_eligibility,
+            'get_health': self.get_health,
+            'improve_tips': self.improve_tips,
+            'recommend_loans': self.recommend_loans
+        }
+    
+    def _cache_path(self, user_id):
+        return os.path.join(self.cache_dir, f'user_{int(user_id)}.json')
+    
+    def _load_cached(self, user_id):
+        if user_id in self._memory:
+            return self._memory[user_id]
+        try:
+            with open(self._cache_path(user_id), 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+    
+    def _store_cached(self, user_id, entry):
+        self._memory[user_id] = entry
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = self._cache_path(user_id) + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, self._cache_path(user_id))
+    
+    def _model_artifacts(self):
+        import inference
+        if self._artifacts is None:
+            self._artifacts = inference.load_model_artifacts()
+        return self._artifacts
+    
+    def _model_version(self):
+        """Training date of the eligibility model, read without loading it"""
+        import inference
+        if self._artifacts is not None:
+            return self._artifacts[2].get('training_date')
+        with open(os.path.join(inference.MODEL_DIR, 'model_metadata.json'), 'r') as f:
+            return json.load(f).get('training_date')
+    
+    def loan_matcher(self):
+        """Active loan products, loaded once and refreshed incrementally"""
+        import psycopg2
+        import inference
+        from loan_matching import LoanMatcher
+        
+        conn = psycopg2.connect(**inference.DB_CONFIG)
+        try:
+            if self._loan_matcher is None:
+                self._loan_matcher = LoanMatcher.load(conn)
+            else:
+                self._loan_matcher.refresh(conn)
+        finally:
+            conn.close()
+        return self._loan_matcher
+    
+    def build_summary(self, df_transactions):
+        """Monthly features plus eligibility and health scores for one user"""
+        import inference
+        
+        if df_transactions.empty:
+            return {
+                'has_history': False,
+                'avg_monthly_income': 0.0,
+                'avg_monthly_expenses': 0.0,
+                'eligibility_score': 30,
+                'risk_level': 'HIGH',
+                'health_score': 35,
+                'health_category': 'At Risk',
+                'features': None
+            }
+        
+        monthly_data = inference.calculate_monthly_aggregates(df_transactions)
+        features = inference.calculate_financial_features(df_transactions, monthly_data)
+        features = {name: float(value) for name, value in features.items()}
+        eligibility = inference.score_features(features, *self._model_artifacts())
+        health = inference.health_from_eligibility(eligibility)
+        
+        return {
+            'has_history': True,
+            'avg_monthly_income': float(monthly_data['income'].mean()),
+            'avg_monthly_expenses': float(monthly_data['expenses'].mean()),
+            'eligibility_score': int(eligibility['eligibility_score']),
+            'risk_level': eligibility['risk_level'],
+            'health_score': int(health['health_score']),
+            'health_category': health['category'],
+            'features': features
+        }
+    
+    def user_summary(self, user_id, deadline=None):
+        """Cached financial summary, recomputed when transactions or the model change
+        
+        Recomputing scores the user, so it runs under the same admission
+        control as the scoring CLI; when shed, the stale summary is used if
+        there is one, otherwise Overloaded propagates.
+        """
+        import admission
+        import inference
+        
+        deadline = deadline or admission.Deadline()
+        conn = inference.connect(deadline)
+        try:
+            cursor = conn.cursor()
+            cursor.execute(
+                'SELECT COUNT(*), COALESCE(MAX(id), 0), COALESCE(SUM(amount), 0) '
+                'FROM transactions WHERE user_id = %s',
+                (user_id,)
+            )
+            count, max_id, total = cursor.fetchone()
+            cursor.close()
+            fingerprint = [int(count), int(max_id), str(total), self._model_version()]
+            
+            cached = self._load_cached(user_id)
+            if cached is not None and cached['fingerprint'] == fingerprint:
+                self._memory[user_id] = cached
+                return cached['summary']
+            
+            try:
+                with admission.admit(deadline):
+                    # Not get_user_transactions: it turns DB errors into an empty frame,
+                    # which would be cached as a "no history" summary
+                    df_transactions = inference.fetch_transaction_columns(conn, [user_id], with_user_id=False)
+                    if df_transactions.empty and count > 0:
+                        raise RuntimeError(f'No transactions read for user {user_id} (expected {count})')
+                    summary = self.build_summary(df_transactions)
+            except admission.Overloaded:
+                if cached is None:
+                    raise
+                return cached['summary']
+        finally:
+            conn.close()
+        
+        self._store_cached(user_id, {'fingerprint': fingerprint, 'summary': summary})
+        return summary
+    
+    def can_execute(self, action):
+        return action in self.executors
+    
+    def execute(self, action, message, user_id):
+        """Return the text appended to the response for ``action``"""
+        summary = self.user_summary(user_id) if action != 'calculate_emi' else None
+        return self.executors[action](message, summary)
+    
+    def calculate_affordability(self, message, summary):
+        income = summary['avg_monthly_income']
+        emi_budget = income * AFFORDABLE_EMI_SHARE
+        # Present value of the EMI budget at the default terms; server.js used to
+        # quote income * 0.4 * 24 / 0.01, which overstates it over 100 times
+        max_loan = float(max_principal(emi_budget, DEFAULT_ANNUAL_RATE, DEFAULT_TENURE_MONTHS))
+        text = (f"\n\nBased on your average monthly income of ₹{round(income)}, "
+                f"you can afford a loan up to ₹{round(max_loan)} with comfortable EMI payments.")
+        
+        offers = self.affordable_offers(summary, emi_budget)
+        if offers:
+            text += f"\n\n🏦 What lenders can offer within an EMI of ₹{round(emi_budget)}/month:\n" + '\n'.join(
+                f"{i + 1}. {o['lender_name']} - ₹{round(o['amount'])} over {o['tenure']} months "
+                f"at {o['interest_rate']:g}% (EMI ₹{round(o['emi'])})"
+                for i, o in enumerate(offers))
+        return text
+    
+    def affordable_offers(self, summary, emi_budget, top_k=3):
+        """Largest affordable quote from each product the user is eligible for"""
+        if emi_budget <= 0:
+            return []
+        matcher = self.loan_matcher()
+        features = summary['features'] or {}
+        mask = matcher.eligibility_mask(
+            summary['avg_monthly_income'],
+            features.get('emi_to_income_ratio', 0.2),
+            summary['health_score']
+        )[0]
+        
+        offers = []
+        for position in np.flatnonzero(mask):
+            product = matcher.product(position)
+            best = self.quote_cache.best_affordable(product, emi_budget)
+            if best is not None:
+                offers.append(dict(best, lender_name=product['lender_name'],
+                                   interest_rate=product['interest_rate']))
+        # Products are in rate order, so equal amounts keep the cheaper lender first
+        offers.sort(key=lambda o: -o['amount'])
+        return offers[:top_k]
+    
+    def calculate_emi(self, message, summary):
+        tenure_match = TENURE_PATTERN.search(message)
+        rate_match = RATE_PATTERN.search(message)
+        
+        # The amount is the first number that is not the tenure or the rate
+        remainder = RATE_PATTERN.sub(' ', TENURE_PATTERN.sub(' ', message))
+        match = AMOUNT_PATTERN.search(remainder)
+        if not match:
+            return ''
+        
+        numbers = [m.group(1) for m in (tenure_match, rate_match) if m] + [match.group(0).replace(',', '')]
+        if any(len(number.split('.')[0]) > MAX_NUMBER_DIGITS for number in numbers):
+            return self.emi_terms_out_of_range()
+        
+        amount = int(match.group(0).replace(',', ''))
+        tenure = DEFAULT_TENURE_MONTHS
+        if tenure_match:
+            tenure = int(tenure_match.group(1))
+            if tenure_match.group(2).lower().startswith('y'):
+                tenure *= 12
+        rate = float(rate_match.group(1)) if rate_match else DEFAULT_ANNUAL_RATE
+        if (not 0 < amount <= MAX_PRINCIPAL or not MIN_TENURE_MONTHS <= tenure <= MAX_TENURE_MONTHS
+                or not 0 <= rate <= MAX_ANNUAL_RATE):
+            return self.emi_terms_out_of_range()
+        
+        installment = float(emi(amount, rate, tenure))
+        first_interest, first_principal = first_installment_split(amount, rate, tenure)
+        return (f"\n\nFor a loan of ₹{amount} at {rate:g}% interest for {tenure} months:\n"
+                f"• Monthly EMI: ₹{round(installment)}\n"
+                f"• Total Payable: ₹{round(installment * tenure)}\n"
+                f"• Total Interest: ₹{round(installment * tenure - amount)}\n"
+                f"• First EMI: ₹{round(float(first_interest))} interest + "
+                f"₹{round(float(first_principal))} principal")
+    
+    def emi_terms_out_of_range(self):
+        return (f"\n\nI can calculate EMIs for amounts up to ₹{MAX_PRINCIPAL}, tenures of "
+                f"{MIN_TENURE_MONTHS}-{MAX_TENURE_MONTHS} months and interest rates up to {MAX_ANNUAL_RATE:g}%.")
+    
+    def get_income(self, message, summary):
+        return (f"\n\nYour average monthly income is ₹{round(summary['avg_monthly_income'])}. "
+                f"This is calculated from your transaction history.")
+    
+    def get_expenses(self, message, summary):
+        income = summary['avg_monthly_income']
+        expenses = summary['avg_monthly_expenses']
+        ratio = f"{round(expenses / income * 100)}%" if income > 0 else 'not available'
+        return (f"\n\nYour average monthly expenses are ₹{round(expenses)}. "
+                f"Your expense-to-income ratio is {ratio}.")
+    
+    def get_savings(self, message, summary):
+        income = summary['avg_monthly_income']
+        savings = income - summary['avg_monthly_expenses']
+        savings_rate = savings / income * 100 if income > 0 else 0
+        verdict = '✅ Great job!' if savings_rate > 20 else '⚠️ Try to save at least 20% of your income.'
+        return (f"\n\nYour average monthly savings: ₹{round(savings)}\n"
+                f"Savings rate: {round(savings_rate)}%\n{verdict}")
+    
+    def get_eligibility(self, message, summary):
+        return (f"\n\nYour loan eligibility score: {summary['eligibility_score']}/100\n"
+                f"Risk Level: {summary['risk_level']}\n"
+                f"This score is based on your income stability, expense patterns, and cashflow consistency.")
+    
+    def get_health(self, message, summary):
+        return (f"\n\nYour financial health score: {summary['health_score']}/100\n"
+                f"This reflects your overall financial wellness including cashflow stability, "
+                f"savings rate, and debt management.")
+    
+    def improve_tips(self, message, summary):
+        income = summary['avg_monthly_income']
+        expenses = summary['avg_monthly_expenses']
+        tips = []
+        if summary['health_score'] < 70:
+            if income <= 0 or expenses / income > 0.7:
+                tips.append('Reduce expenses to below 70% of income')
+            if income <= 0 or (income - expenses) / income < 0.2:
+                tips.append('Increase savings rate to at least 20%')
+            tips.append('Maintain consistent positive cashflow')
+        if not tips:
+            return "\n\n✅ Your score is already strong! Keep maintaining healthy financial habits."
+        return "\n\n💡 Tips to improve your score:\n" + '\n'.join(
+            f"{i + 1}. {tip}" for i, tip in enumerate(tips))
+
+    def recommend_loans(self, message, summary):
+        features = summary['features'] or {}
+        products = self.loan_matcher().recommend(
+            summary['avg_monthly_income'],
+            features.get('emi_to_income_ratio', 0.2),
+            summary['health_score']
+        )
+        if not products:
+            return ("\n\nNo loan products match your current profile yet. "
+                    "Improving your health score and income stability will unlock more options.")
+        lines = [
+            f"{i + 1}. {p['lender_name']} - {p['interest_rate']:g}% interest, "
+            f"₹{round(p['min_amount'])} to ₹{round(p['max_amount'])}, {p['min_tenure']}-{p['max_tenure']} months"
+            for i, p in enumerate(products)
+        ]
+        return "\n\n🏦 Best matches for your profile:\n" + '\n'.join(lines)
 
 class FinancialChatbot:
-    def __init__(self):
-        self.lemmatizer = WordNetLemmatizer()
+    def __init__(self, feedback_logging=True):
+        self.preprocessor = TextPreprocessor.load()
+        self.lemma_table = self.preprocessor.lemma_table
         self.intents = self.load_intents()
+        self.intents_by_tag = {intent['tag']: intent for intent in self.intents['intents']}
+        self.pattern_index = None
         self.model = None
+        self.model_mtime = None
+        self.compact_model = None
+        self.feedback_logging = feedback_logging
+        self.action_executor = ActionExecutor()
         self.vectorizer = None
         self.intent_labels = []
+        self.messages_seen = 0
+        self.fast_path_hits = 0
+        self.last_fast_path = False
         
     def load_intents(self):
         """Load chatbot intents and training data"""
@@ -282,22 +616,73 @@ class FinancialChatbot:
     
     def preprocess_text(self, text):
         """Preprocess and tokenize text"""
-        tokens = nltk.word_tokenize(text.lower())
-        return ' '.join([self.lemmatizer.lemmatize(token) for token in tokens])
+        return self.preprocessor.preprocess(text)
+    
+    def match_key(self, processed_text):
+        """Reduce preprocessed text to the key used for exact pattern matching"""
+        return ' '.join([token for token in processed_text.split() if any(c.isalnum() for c in token)])
+    
+    def build_pattern_index(self):
+        """Index normalized patterns by intent tag for the exact-match fast path"""
+        index = {}
+        for intent in self.intents['intents']:
+            for pattern in intent['patterns']:
+                key = self.match_key(self.preprocess_text(pattern))
+                # A pattern shared by two intents is ambiguous; leave it to the model
+                if index.get(key, intent['tag']) != intent['tag']:
+                    index[key] = None
+                else:
+                    index[key] = intent['tag']
+        return index
+    
+    def fast_path_stats(self):
+        """Report how many messages were answered by the exact-match index"""
+        return {
+            'messages': self.messages_seen,
+            'fast_path_hits': self.fast_path_hits,
+            'hit_rate': self.fast_path_hits / self.messages_seen if self.messages_seen else 0.0
+        }
     
     def train(self):
         """Train the NLP model"""
         print("Training NLP chatbot model...")
         
-        # Prepare training data
+        os.makedirs('ml/models', exist_ok=True)
+        with open(LEARNING_LOCK_PATH, 'w') as lock:
+            # The retrained model replaces the one online learning updated, so it
+            # is trained on every labeled correction logged so far and the learning
+            # offset moves past them; holding the lock keeps a learner from
+            # applying them again to the new model
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            previous_version = load_learning_state()['model_version'] or 0
+            records, offset = read_feedback()
+            feedback = labeled_examples(records, self.intents_by_tag)
+            self.fit_and_save(feedback, version=previous_version + 1)
+            save_learning_state({
+                'offset': offset,
+                'examples_learned': len(feedback),
+                'model_version': self.compact_model.version
+            })
+    
+    def fit_and_save(self, feedback, version=1):
+        """Fit both intent models on the intent patterns plus labeled feedback"""
+        # Prepare training data (always lemmatized with WordNet so new words are covered)
+        self.preprocessor = TextPreprocessor()
+        raw_patterns = []
         patterns = []
         labels = []
         
         for intent in self.intents['intents']:
             for pattern in intent['patterns']:
+                raw_patterns.append(pattern)
                 patterns.append(self.preprocess_text(pattern))
                 labels.append(intent['tag'])
         
+        for record in feedback:
+            raw_patterns.append(record['message'])
+            patterns.append(self.preprocess_text(record['message']))
+            labels.append(record['label'])
+        
         # Create and train pipeline
         self.model = Pipeline([
             ('tfidf', TfidfVectorizer(ngram_range=(1, 2), max_features=1000)),
@@ -307,7 +692,18 @@ class FinancialChatbot:
         self.model.fit(patterns, labels)
         self.intent_labels = list(set(labels))
         
-        print(f"✅ Model trained with {len(patterns)} patterns and {len(self.intent_labels)} intents")
+        # Compact hashed equivalent of the pipeline for fast loading
+        self.compact_model = HashedIntentClassifier.fit(patterns, labels)
+        self.compact_model.version = version
+        
+        # Precompute lemmas so prediction never has to load WordNet
+        vocabulary = self.model.named_steps['tfidf'].vocabulary_
+        self.lemma_table = self.preprocessor.build_lemma_table(raw_patterns, vocabulary)
+        self.preprocessor = TextPreprocessor(lemma_table=self.lemma_table)
+        self.pattern_index = None
+        
+        print(f"✅ Model trained with {len(patterns)} patterns ({len(feedback)} from feedback) "
+              f"and {len(self.intent_labels)} intents")
         
         # Save model
         self.save_model()
@@ -320,13 +716,33 @@ class FinancialChatbot:
         with open(f'{model_dir}/chatbot_model.pkl', 'wb') as f:
             pickle.dump(self.model, f)
         
-        with open(f'{model_dir}/chatbot_intents.json', 'w') as f:
-            json.dump(self.intents, f, indent=2)
+        if self.compact_model is not None:
+            self.compact_model.save(HASHED_MODEL_PATH)
+        
+        # Only rewrite the intents file when the intents actually changed
+        intents_path = f'{model_dir}/chatbot_intents.json'
+        try:
+            with open(intents_path, 'r') as f:
+                intents_changed = json.load(f) != self.intents
+        except (FileNotFoundError, json.JSONDecodeError):
+            intents_changed = True
+        
+        if intents_changed:
+            with open(intents_path, 'w') as f:
+                json.dump(self.intents, f, indent=2)
+        
+        save_lemma_table(self.lemma_table, f'{model_dir}/chatbot_lemmas.json')
         
         print("✅ Chatbot model saved")
     
     def load_model(self):
-        """Load trained model"""
+        """Load trained model, preferring the compact .npz artifact"""
+        if os.path.exists(HASHED_MODEL_PATH):
+            self.model_mtime = os.stat(HASHED_MODEL_PATH).st_mtime_ns
+            self.model = HashedIntentClassifier.load(HASHED_MODEL_PATH)
+            print("✅ Chatbot model loaded")
+            return True
+        
         try:
             with open('ml/models/chatbot_model.pkl', 'rb') as f:
                 self.model = pickle.load(f)
@@ -337,71 +753,151 @@ class FinancialChatbot:
             self.train()
             return True
     
+    def refresh_model(self):
+        """Pick up a newly published compact model version without a restart"""
+        if self.model_mtime is None:
+            return False
+        try:
+            mtime = os.stat(HASHED_MODEL_PATH).st_mtime_ns
+        except FileNotFoundError:
+            return False
+        if mtime == self.model_mtime:
+            return False
+        self.model_mtime = mtime
+        self.model = HashedIntentClassifier.load(HASHED_MODEL_PATH)
+        return True
+    
+    def correct(self, message, tag):
+        """Record the intent a message should have mapped to"""
+        if tag not in self.intents_by_tag:
+            raise ValueError(f"Unknown intent: {tag}")
+        intent, confidence = self.predict_intent(message)
+        log_feedback(message, intent, confidence, label=tag, source='correction')
+    
     def predict_intent(self, message):
         """Predict intent from user message"""
+        if self.pattern_index is None:
+            self.pattern_index = self.build_pattern_index()
+        
         processed_message = self.preprocess_text(message)
-        intent = self.model.predict([processed_message])[0]
+        self.messages_seen += 1
+        
+        # Fast path: literal or near-literal copy of a training pattern
+        intent = self.pattern_index.get(self.match_key(processed_message))
+        self.last_fast_path = intent is not None
+        if intent is not None:
+            self.fast_path_hits += 1
+            return intent, 1.0
+        
+        # Single model pass; the argmax of the probabilities is the prediction
         probabilities = self.model.predict_proba([processed_message])[0]
-        confidence = max(probabilities)
+        best = int(np.argmax(probabilities))
         
-        return intent, confidence
+        return str(self.model.classes_[best]), float(probabilities[best])
+    
+    def resolve_action(self, result, message, user_id):
+        """Run the intent's action in-process and append its output to the response"""
+        action = result.get('action')
+        if not action or not self.action_executor.can_execute(action):
+            return result
+        try:
+            result['response'] += self.action_executor.execute(action, message, user_id)
+            result['action_resolved'] = True
+        except Exception as e:
+            # Leave the action to the caller when user data is unavailable
+            print(f"Action error: {e}", file=sys.stderr)
+        return result
     
-    def get_response(self, message):
+    def get_response(self, message, user_id=None):
         """Get chatbot response"""
+        self.refresh_model()
         intent, confidence = self.predict_intent(message)
         
-        # If confidence is too low, return help message
-        if confidence < 0.3:
+        # If confidence is too low, log the message for review and return help message
+        if confidence < LOW_CONFIDENCE_THRESHOLD:
+            if self.feedback_logging:
+                log_feedback(message, intent, confidence)
             return {
                 'intent': 'unknown',
                 'confidence': confidence,
                 'response': "I'm not sure I understood that. I can help you with loan calculations, financial scores, expense analysis, and more. What would you like to know?",
-                'action': None
+                'action': None,
+                'fast_path': self.last_fast_path
             }
         
-        # Find intent and get response
-        for intent_data in self.intents['intents']:
-            if intent_data['tag'] == intent:
-                response = random.choice(intent_data['responses'])
-                action = intent_data.get('action', None)
-                
-                return {
-                    'intent': intent,
-                    'confidence': confidence,
-                    'response': response,
-                    'action': action
-                }
+        intent_data = self.intents_by_tag.get(intent)
+        if intent_data is not None:
+            result = {
+                'intent': intent,
+                'confidence': confidence,
+                'response': random.choice(intent_data['responses']),
+                'action': intent_data.get('action', None),
+                'fast_path': self.last_fast_path
+            }
+            if user_id is not None:
+                self.resolve_action(result, message, user_id)
+            return result
         
         return {
             'intent': 'unknown',
             'confidence': 0,
             'response': "I'm here to help with your financial questions. What would you like to know?",
-            'action': None
+            'action': None,
+            'fast_path': self.last_fast_path
         }
 
 def main():
     """Main entry point"""
-    import sys
+    # Fast-path hit rate of the predict processes the backend runs
+    if len(sys.argv) > 1 and sys.argv[1] == 'stats':
+        stats = load_predict_stats()
+        stats['hit_rate'] = stats['fast_path_hits'] / stats['messages'] if stats['messages'] else 0.0
+        print(json.dumps(stats))
+        sys.exit(0)
     
-    chatbot = FinancialChatbot()
+    chatbot = FinancialChatbot(feedback_logging=os.getenv('CHATBOT_FEEDBACK_LOG', '1') != '0')
+    command = sys.argv[1] if len(sys.argv) > 1 else None
     
-    # Train or load model
-    if not os.path.exists('ml/models/chatbot_model.pkl'):
-        chatbot.train()
-    else:
-        chatbot.load_model()
+    # Train or load model; commands answer in JSON, so status goes to stderr
+    status_output = contextlib.redirect_stdout(sys.stderr) if command else contextlib.nullcontext()
+    with status_output:
+        if not os.path.exists('ml/models/chatbot_model.pkl'):
+            chatbot.train()
+        else:
+            chatbot.load_model()
     
     # Check if running in prediction mode (called from backend)
-    if len(sys.argv) > 1 and sys.argv[1] == 'predict':
+    if command == 'predict':
         if len(sys.argv) < 3:
             print(json.dumps({'error': 'Message required'}))
             sys.exit(1)
         
         message = sys.argv[2]
-        result = chatbot.get_response(message)
+        user_id = int(sys.argv[3]) if len(sys.argv) > 3 else None
+        result = chatbot.get_response(message, user_id)
+        record_predict_stats(result['fast_path'])
         print(json.dumps(result))
         sys.exit(0)
     
+    # Record a user correction for online learning
+    if len(sys.argv) > 1 and sys.argv[1] == 'correct':
+        if len(sys.argv) < 4:
+            print(json.dumps({'error': 'Message and intent required'}))
+            sys.exit(1)
+        
+        try:
+            chatbot.correct(sys.argv[2], sys.argv[3])
+        except ValueError as e:
+            print(json.dumps({'error': str(e)}))
+            sys.exit(1)
+        print(json.dumps({'success': True}))
+        sys.exit(0)
+    
+    # Fold labeled feedback into the model and publish a new version
+    if len(sys.argv) > 1 and sys.argv[1] == 'learn':
+        print(json.dumps(learn_from_feedback(chatbot)))
+        sys.exit(0)
+    
     # Interactive mode
     print("\n" + "="*60)
     print("FinBridge AI Chatbot - NLP Powered")
@@ -412,6 +908,8 @@ def main():
         user_input = input("You: ")
         if user_input.lower() in ['quit', 'exit', 'bye']:
             print("Chatbot: Goodbye! Take care of your finances!")
+            stats = chatbot.fast_path_stats()
+            print(f"[Fast path: {stats['fast_path_hits']}/{stats['messages']} messages ({stats['hit_rate']:.0%})]")
             break
         
         result = chatbot.get_response(user_input)
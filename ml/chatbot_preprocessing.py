@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+FinBridge Chatbot Text Preprocessing
+Fast regex tokenization and memoized lemmatization for chat messages
+"""
+
+import json
+import os
+import re
+from functools import lru_cache
+
+# Configuration
+LEMMA_TABLE_PATH = 'ml/models/chatbot_lemmas.json'
+TOKEN_CACHE_SIZE = 4096
+MESSAGE_CACHE_SIZE = 1024
+
+# Precompiled equivalent of nltk.word_tokenize for lowercased chat messages.
+# Alternatives are tried in order, so contractions are split off before the
+# generic word rule gets a chance to swallow the apostrophe.
+TOKEN_PATTERN = re.compile(r"""
+    \b(?:can(?=not\b)|gim(?=me\b)|gon(?=na\b)|got(?=ta\b)|lem(?=me\b)|wan(?=na\s))
+  | \w+(?=n't\b)
+  | n't\b
+  | \w+(?='(?:s|m|d|ll|re|ve)\b)
+  | '(?:s|m|d|ll|re|ve)\b
+  | \w+(?:(?:[-.']|[,:](?=\d))\w+)*
+  | \.\.\.
+  | --
+  | \S
+""", re.VERBOSE)
+
+
+def ensure_nltk_data(resources=(('corpora/wordnet', 'wordnet'), ('corpora/omw-1.4', 'omw-1.4'))):
+    """Download NLTK resources on first use only"""
+    import nltk
+
+    for path, name in resources:
+        try:
+            nltk.data.find(path)
+        except LookupError:
+            nltk.download(name)
+
+
+def tokenize(text):
+    """Split lowercased text into word_tokenize-compatible tokens"""
+    return TOKEN_PATTERN.findall(text)
+
+
+def normalize_message(message):
+    """Normalize case and whitespace so equivalent messages share a cache entry"""
+    return ' '.join(message.lower().split())
+
+
+def load_lemma_table(path=LEMMA_TABLE_PATH):
+    """Load the precomputed token -> lemma table, or None if it was never built"""
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def save_lemma_table(lemma_table, path=LEMMA_TABLE_PATH):
+    """Save the token -> lemma table next to the chatbot model"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(lemma_table, f, indent=2, sort_keys=True)
+
+
+def inflection_candidates(term):
+    """Common surface forms of a vocabulary term that WordNet maps back to it"""
+    candidates = [term + 's', term + 'es']
+    if term.endswith('y'):
+        candidates.append(term[:-1] + 'ies')
+    return candidates
+
+
+class TextPreprocessor:
+    """Tokenize and lemmatize chat messages with bounded LRU caches
+
+    With a lemma table, tokens outside the table pass through unchanged and
+    WordNet is never loaded. Without one, WordNet is loaded lazily on the
+    first token that misses the cache.
+    """
+
+    def __init__(self, lemma_table=None, token_cache_size=TOKEN_CACHE_SIZE,
+                 message_cache_size=MESSAGE_CACHE_SIZE):
+        self.lemma_table = lemma_table
+        self._wordnet = None
+        self._lemmatize_cached = lru_cache(maxsize=token_cache_size)(self._lemmatize)
+        self._preprocess_cached = lru_cache(maxsize=message_cache_size)(self._preprocess)
+
+    @classmethod
+    def load(cls, path=LEMMA_TABLE_PATH):
+        """Create a preprocessor backed by the saved lemma table if present"""
+        return cls(lemma_table=load_lemma_table(path))
+
+    @property
+    def uses_wordnet(self):
+        return self.lemma_table is None
+
+    def _wordnet_lemmatizer(self):
+        if self._wordnet is None:
+            ensure_nltk_data()
+            from nltk.stem import WordNetLemmatizer
+            self._wordnet = WordNetLemmatizer()
+        return self._wordnet
+
+    def _lemmatize(self, token):
+        if self.lemma_table is not None:
+            return self.lemma_table.get(token, token)
+        return self._wordnet_lemmatizer().lemmatize(token)
+
+    def lemmatize(self, token):
+        """Lemmatize a single token"""
+        return self._lemmatize_cached(token)
+
+    def _preprocess(self, normalized):
+        return ' '.join([self._lemmatize_cached(token) for token in tokenize(normalized)])
+
+    def preprocess(self, text):
+        """Preprocess and tokenize text"""
+        return self._preprocess_cached(normalize_message(text))
+
+    def build_lemma_table(self, texts, vocabulary):
+        """Precompute lemmas for the training tokens and the model vocabulary
+
+        Covers every token seen in ``texts`` plus common inflections of the
+        unigram vocabulary terms, keeping only tokens whose lemma differs from
+        the token itself.
+        """
+        lemmatizer = self._wordnet_lemmatizer()
+        lemma_table = {}
+
+        for text in texts:
+            for token in tokenize(normalize_message(text)):
+                lemma = lemmatizer.lemmatize(token)
+                if lemma != token:
+                    lemma_table[token] = lemma
+
+        unigrams = {term for term in vocabulary if ' ' not in term and term.isalpha()}
+        for term in unigrams:
+            for candidate in inflection_candidates(term):
+                lemma = lemmatizer.lemmatize(candidate)
+                if lemma != candidate and lemma in unigrams:
+                    lemma_table.setdefault(candidate, lemma)
+
+        return lemma_table
+
+    def cache_info(self):
+        """Return hit/miss statistics for the token and message caches"""
+        return {
+            'tokens': self._lemmatize_cached.cache_info()._asdict(),
+            'messages': self._preprocess_cached.cache_info()._asdict()
+        }
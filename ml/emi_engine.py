@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+FinBridge EMI Engine
+Vectorized EMI, total interest and amortization over loan quote grids
+
+Every function broadcasts its amount, annual rate (percent, as stored in
+loan_products.interest_rate) and tenure (months) arguments, so a whole
+amount x tenure x rate grid is one NumPy expression. EMI is linear in the
+amount, so each product caches one EMI factor per tenure and any amount
+is quoted with a multiplication.
+"""
+
+from collections import OrderedDict
+import numpy as np
+
+# Configuration
+DEFAULT_ANNUAL_RATE = 12.0
+DEFAULT_TENURE_MONTHS = 24
+# Bounds for terms taken from user input
+MIN_TENURE_MONTHS = 1
+MAX_TENURE_MONTHS = 360
+MAX_ANNUAL_RATE = 60.0
+MAX_PRINCIPAL = 10 ** 10
+AMOUNT_STEPS = 10
+STANDARD_TENURES = (3, 6, 12, 18, 24, 36, 48, 60, 84, 120, 180, 240)
+GRID_CACHE_SIZE = 256
+
+
+def monthly_rate(annual_rate):
+    return np.asarray(annual_rate, dtype=np.float64) / 1200
+
+
+def emi(principal, annual_rate, tenure_months):
+    """Equated monthly installment; zero-rate loans are repaid in equal parts"""
+    principal, rate, tenure = np.broadcast_arrays(
+        np.asarray(principal, dtype=np.float64), monthly_rate(annual_rate),
+        np.asarray(tenure_months, dtype=np.float64))
+    growth = (1 + rate) ** tenure
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(rate > 0, principal * rate * growth / (growth - 1), principal / tenure)
+
+
+def total_payable(principal, annual_rate, tenure_months):
+    return emi(principal, annual_rate, tenure_months) * np.asarray(tenure_months, dtype=np.float64)
+
+
+def total_interest(principal, annual_rate, tenure_months):
+    return total_payable(principal, annual_rate, tenure_months) - np.asarray(principal, dtype=np.float64)
+
+
+def max_principal(emi_budget, annual_rate, tenure_months):
+    """Largest loan whose EMI fits ``emi_budget`` (inverse of emi)"""
+    budget, rate, tenure = np.broadcast_arrays(
+        np.asarray(emi_budget, dtype=np.float64), monthly_rate(annual_rate),
+        np.asarray(tenure_months, dtype=np.float64))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(rate > 0, budget * (1 - (1 + rate) ** -tenure) / rate, budget * tenure)
+
+
+def first_installment_split(principal, annual_rate, tenure_months):
+    """Interest and principal parts of the first EMI, without building the schedule"""
+    interest = np.asarray(principal, dtype=np.float64) * monthly_rate(annual_rate)
+    return interest, emi(principal, annual_rate, tenure_months) - interest
+
+
+def amortization_schedule(principal, annual_rate, tenure_months):
+    """Month-by-month schedule for one loan or a broadcast batch of loans
+
+    Returns arrays with a trailing month axis as long as the longest
+    tenure: ``payment``, ``interest``, ``principal`` and closing
+    ``balance``. Months past a loan's own tenure are zero.
+    """
+    principal, rate, tenure = np.broadcast_arrays(
+        np.asarray(principal, dtype=np.float64), monthly_rate(annual_rate),
+        np.asarray(tenure_months, dtype=np.float64))
+    installment = emi(principal, annual_rate, tenure)[..., None]
+    month = np.arange(1, int(tenure.max()) + 1, dtype=np.float64)
+    principal, rate, tenure = principal[..., None], rate[..., None], tenure[..., None]
+
+    # Closed-form balance after k payments, so no month-by-month loop
+    growth = (1 + rate) ** month
+    with np.errstate(divide='ignore', invalid='ignore'):
+        balance = np.where(rate > 0, principal * growth - installment * (growth - 1) / rate,
+                           principal - installment * month)
+    balance = np.where(month >= tenure, 0.0, balance)
+
+    opening = np.concatenate([principal, balance[..., :-1]], axis=-1)
+    active = month <= tenure
+    interest = np.where(active, opening * rate, 0.0)
+    repaid = np.where(active, opening - balance, 0.0)
+    return {
+        'month': month.astype(np.int64),
+        'payment': interest + repaid,
+        'interest': interest,
+        'principal': repaid,
+        'balance': balance
+    }
+
+
+def product_tenures(min_tenure, max_tenure):
+    """Standard tenures inside a product's range, plus its bounds"""
+    tenures = [t for t in STANDARD_TENURES if min_tenure < t < max_tenure]
+    return np.unique(np.array([min_tenure, *tenures, max_tenure], dtype=np.int64))
+
+
+def product_amounts(min_amount, max_amount, steps=AMOUNT_STEPS):
+    return np.unique(np.round(np.linspace(min_amount, max_amount, steps)))
+
+
+class QuoteGridCache:
+    """Per-product amount x tenure quote grids, LRU-bounded
+
+    Keyed by the product's terms rather than its id alone, so an edited
+    product (new rate or ranges) gets a fresh grid.
+    """
+
+    def __init__(self, maxsize=GRID_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._grids = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(product):
+        return (product['id'], float(product['min_amount']), float(product['max_amount']),
+                float(product['interest_rate']), int(product['min_tenure']), int(product['max_tenure']))
+
+    def grid(self, product):
+        key = self._key(product)
+        if key in self._grids:
+            self._grids.move_to_end(key)
+            self.hits += 1
+            return self._grids[key]
+
+        self.misses += 1
+        amounts = product_amounts(float(product['min_amount']), float(product['max_amount']))
+        tenures = product_tenures(int(product['min_tenure']), int(product['max_tenure']))
+        rate = float(product['interest_rate'])
+        emi_factor = emi(1.0, rate, tenures)
+        installments = amounts[:, None] * emi_factor[None, :]
+        grid = {
+            'product_id': product['id'],
+            'interest_rate': rate,
+            'amounts': amounts,
+            'tenures': tenures,
+            'emi_factor': emi_factor,
+            'emi': installments,
+            'total_interest': installments * tenures[None, :] - amounts[:, None]
+        }
+        # Shared between callers, so keep the cached arrays immutable
+        for name in ('amounts', 'tenures', 'emi_factor', 'emi', 'total_interest'):
+            grid[name].setflags(write=False)
+
+        self._grids[key] = grid
+        if len(self._grids) > self.maxsize:
+            self._grids.popitem(last=False)
+        return grid
+
+    def quote(self, product, amount):
+        """EMI and total interest of ``amount`` at each of the product's tenures"""
+        grid = self.grid(product)
+        installments = np.asarray(amount, dtype=np.float64)[..., None] * grid['emi_factor']
+        return {
+            'tenures': grid['tenures'],
+            'emi': installments,
+            'total_interest': installments * grid['tenures'] - np.asarray(amount, dtype=np.float64)[..., None]
+        }
+
+    def best_affordable(self, product, emi_budget):
+        """Largest grid amount with an EMI inside the budget, at its cheapest such tenure
+
+        Returns None when even the product minimum is out of reach.
+        """
+        grid = self.grid(product)
+        fits = grid['emi'] <= emi_budget
+        rows = np.flatnonzero(fits.any(axis=1))
+        if len(rows) == 0:
+            return None
+        row = rows[-1]
+        # The shortest affordable tenure carries the least interest
+        col = np.flatnonzero(fits[row])[0]
+        return {
+            'amount': float(grid['amounts'][row]),
+            'tenure': int(grid['tenures'][col]),
+            'emi': float(grid['emi'][row, col]),
+            'total_interest': float(grid['total_interest'][row, col])
+        }
+
+
+def quote_grid(amounts, tenures, annual_rates):
+    """EMI and total interest over the full rates x amounts x tenures grid"""
+    amounts = np.asarray(amounts, dtype=np.float64)[None, :, None]
+    tenures = np.asarray(tenures, dtype=np.float64)[None, None, :]
+    annual_rates = np.asarray(annual_rates, dtype=np.float64)[:, None, None]
+    installments = emi(amounts, annual_rates, tenures)
+    return {'emi': installments, 'total_interest': installments * tenures - amounts}
+
@@ -0,0 +1,461 @@
+#!/usr/bin/env python3
+"""
+FinBridge Feature Monitoring
+Bounded-memory drift monitoring of live features against the training data
+
+Every score updates a KLL-style quantile sketch and a fixed-bin histogram
+per feature and for the predicted default probability. Both are mergeable,
+so each process keeps its own small monitor and, when it exits, drops it
+as a delta file into a pending directory - no lock and no read of the
+shared state. The scheduler (after each pass) and the report fold pending
+deltas into per-day windows of the state file. The training distribution
+is summarized once into a baseline with the histogram bins, so drift
+reports (PSI and KS) read only local JSON files and never touch the
+database.
+
+Usage:
+    python ml/feature_monitor.py baseline
+    python ml/feature_monitor.py report [--days N]
+    python ml/feature_monitor.py compact
+"""
+
+import argparse
+import atexit
+import bisect
+import fcntl
+import json
+import math
+import os
+import random
+import sys
+import threading
+import time
+import numpy as np
+
+# Configuration
+MODEL_DIR = 'ml/models'
+BASELINE_PATH = os.path.join(MODEL_DIR, 'feature_baseline.json')
+MONITOR_STATE_PATH = os.path.join(MODEL_DIR, 'feature_monitor_state.json')
+MONITOR_LOCK_PATH = os.path.join(MODEL_DIR, 'feature_monitor.lock')
+PENDING_DIR = os.path.join(MODEL_DIR, 'feature_monitor_pending')
+MONITOR_ENABLED = os.getenv('FEATURE_MONITORING', '1') != '0'
+PROBABILITY_METRIC = 'default_probability'
+SKETCH_K = 128
+N_BINS = 10
+RETENTION_DAYS = 30
+PSI_MODERATE = 0.1
+PSI_SIGNIFICANT = 0.25
+
+
+class QuantileSketch:
+    """KLL quantile sketch: mergeable, with memory bounded by about 3k items
+
+    Level ``h`` holds items of weight ``2**h``. When a level outgrows its
+    capacity it is sorted and every other item (random offset) is promoted,
+    which keeps the total weight equal to the number of updates.
+    """
+
+    def __init__(self, k=SKETCH_K, n=0, minimum=math.inf, maximum=-math.inf, levels=None):
+        self.k = int(k)
+        self.n = int(n)
+        self.min = float(minimum)
+        self.max = float(maximum)
+        self.levels = [list(level) for level in levels] if levels else [[]]
+        self._rng = random.Random()
+
+    def _capacity(self, level):
+        depth = len(self.levels) - level - 1
+        return max(2, int(math.ceil(self.k * (2 / 3) ** depth)))
+
+    def _compress(self):
+        level = 0
+        while level < len(self.levels):
+            items = self.levels[level]
+            if len(items) >= self._capacity(level):
+                if level + 1 == len(self.levels):
+                    self.levels.append([])
+                items.sort()
+                # An odd item out stays behind so no weight is lost
+                keep = items[-1:] if len(items) % 2 else []
+                offset = self._rng.randint(0, 1)
+                self.levels[level + 1].extend(items[offset:len(items) - len(keep):2])
+                self.levels[level] = keep
+            level += 1
+
+    def update(self, value):
+        value = float(value)
+        self.n += 1
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        self.levels[0].append(value)
+        if len(self.levels[0]) >= self._capacity(0):
+            self._compress()
+
+    def merge(self, other):
+        """Fold another sketch into this one"""
+        while len(self.levels) < len(other.levels):
+            self.levels.append([])
+        for level, items in enumerate(other.levels):
+            self.levels[level].extend(items)
+        self.n += other.n
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._compress()
+        return self
+
+    def weighted_items(self):
+        """Retained values and their weights, sorted by value"""
+        values = np.concatenate([np.asarray(items, dtype=np.float64) for items in self.levels])
+        weights = np.concatenate([np.full(len(items), 2.0 ** level) for level, items in enumerate(self.levels)])
+        order = np.argsort(values, kind='stable')
+        return values[order], weights[order]
+
+    def cdf(self, points):
+        """Estimated fraction of updates <= each point"""
+        values, weights = self.weighted_items()
+        cumulative = np.concatenate([[0.0], np.cumsum(weights)])
+        return cumulative[np.searchsorted(values, points, side='right')] / max(self.n, 1)
+
+    def quantiles(self, qs):
+        if self.n == 0:
+            return [None] * len(qs)
+        values, weights = self.weighted_items()
+        cumulative = np.cumsum(weights)
+        positions = np.searchsorted(cumulative, np.asarray(qs) * self.n, side='left')
+        return values[np.minimum(positions, len(values) - 1)].tolist()
+
+    def to_dict(self):
+        return {'k': self.k, 'n': self.n, 'min': self.min, 'max': self.max, 'levels': self.levels}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['k'], data['n'], data['min'], data['max'], data['levels'])
+
+
+class BinnedHistogram:
+    """Counts over fixed bins; ``cuts`` are the interior bin edges"""
+
+    def __init__(self, cuts, counts=None):
+        self.cuts = [float(c) for c in cuts]
+        self.counts = list(counts) if counts is not None else [0] * (len(self.cuts) + 1)
+
+    def update(self, value):
+        self.counts[bisect.bisect_right(self.cuts, value)] += 1
+
+    def merge(self, other):
+        if other.cuts != self.cuts:
+            raise ValueError('Cannot merge histograms with different bins')
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        return self
+
+    def fractions(self):
+        total = sum(self.counts)
+        return [count / total if total else 0.0 for count in self.counts]
+
+    def to_dict(self):
+        return {'cuts': self.cuts, 'counts': self.counts}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['cuts'], data['counts'])
+
+
+def bin_cuts(values, n_bins=N_BINS):
+    """Quantile bin edges; low-cardinality features get one bin per value"""
+    values = np.asarray(values, dtype=np.float64)
+    unique = np.unique(values)
+    if len(unique) <= n_bins:
+        return ((unique[:-1] + unique[1:]) / 2).tolist()
+    return np.unique(np.quantile(values, np.linspace(0, 1, n_bins + 1)[1:-1])).tolist()
+
+
+class FeatureMonitor:
+    """Per-metric sketches and histograms for one process"""
+
+    def __init__(self, metrics, cuts=None, baseline_version=None, k=SKETCH_K):
+        self.metrics = list(metrics)
+        self.baseline_version = baseline_version
+        self.sketches = {metric: QuantileSketch(k) for metric in self.metrics}
+        cuts = cuts or {}
+        self.histograms = {metric: BinnedHistogram(cuts[metric]) for metric in self.metrics if metric in cuts}
+        # The scheduler scores batches from several threads
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_baseline(cls, baseline):
+        cuts = {metric: stats['cuts'] for metric, stats in baseline['metrics'].items()}
+        return cls(list(baseline['metrics']), cuts, baseline['version'])
+
+    @property
+    def n(self):
+        return max((sketch.n for sketch in self.sketches.values()), default=0)
+
+    def update(self, features, probability):
+        with self.lock:
+            for metric in self.metrics:
+                value = probability if metric == PROBABILITY_METRIC else features.get(metric)
+                if value is None:
+                    continue
+                self.sketches[metric].update(value)
+                if metric in self.histograms:
+                    self.histograms[metric].update(value)
+
+    def merge(self, other):
+        with self.lock:
+            for metric, sketch in other.sketches.items():
+                if metric in self.sketches:
+                    self.sketches[metric].merge(sketch)
+            for metric, histogram in other.histograms.items():
+                if metric in self.histograms:
+                    self.histograms[metric].merge(histogram)
+        return self
+
+    def to_dict(self):
+        return {
+            'baseline_version': self.baseline_version,
+            'metrics': self.metrics,
+            'sketches': {metric: sketch.to_dict() for metric, sketch in self.sketches.items()},
+            'histograms': {metric: histogram.to_dict() for metric, histogram in self.histograms.items()}
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        monitor = cls(data['metrics'], baseline_version=data['baseline_version'])
+        monitor.sketches = {metric: QuantileSketch.from_dict(s) for metric, s in data['sketches'].items()}
+        monitor.histograms = {metric: BinnedHistogram.from_dict(h) for metric, h in data['histograms'].items()}
+        return monitor
+
+
+def build_baseline(feature_frame, probabilities, version, n_bins=N_BINS):
+    """Summarize the training features and predicted probabilities
+
+    The baseline keeps the histogram bins the live monitors use, the
+    training fraction in each bin (for PSI) and a sketch (for KS).
+    """
+    columns = {column: feature_frame[column].to_numpy(dtype=np.float64) for column in feature_frame.columns}
+    columns[PROBABILITY_METRIC] = np.asarray(probabilities, dtype=np.float64)
+
+    metrics = {}
+    for metric, values in columns.items():
+        histogram = BinnedHistogram(bin_cuts(values, n_bins))
+        histogram.counts = np.bincount(np.searchsorted(histogram.cuts, values, side='right'),
+                                       minlength=len(histogram.cuts) + 1).tolist()
+        sketch = QuantileSketch()
+        for value in values.tolist():
+            sketch.update(value)
+        metrics[metric] = {
+            'cuts': histogram.cuts,
+            'fractions': histogram.fractions(),
+            'sketch': sketch.to_dict()
+        }
+    return {'version': version, 'n': len(feature_frame), 'metrics': metrics}
+
+
+def save_json(data, path):
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def load_baseline(path=BASELINE_PATH):
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def load_state(path=MONITOR_STATE_PATH):
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {'windows': []}
+
+
+_monitor = None
+_monitor_lock = threading.Lock()
+
+
+def record(features, probability):
+    """Add one live score to this process's monitor (no I/O after the first call)"""
+    global _monitor
+    if not MONITOR_ENABLED:
+        return
+    if _monitor is None:
+        with _monitor_lock:
+            if _monitor is None:
+                baseline = load_baseline()
+                if baseline is not None:
+                    _monitor = FeatureMonitor.from_baseline(baseline)
+                else:
+                    _monitor = FeatureMonitor(list(features) + [PROBABILITY_METRIC])
+                atexit.register(flush)
+    _monitor.update(features, probability)
+
+
+def flush(pending_dir=PENDING_DIR):
+    """Write this process's monitor as a delta file for the next compaction
+
+    Cost is proportional to this process's own sketch, independent of the
+    accumulated state, and needs no lock: the file is renamed into place.
+    """
+    global _monitor
+    with _monitor_lock:
+        monitor = _monitor
+        if monitor is None or monitor.n == 0:
+            return 0
+        _monitor = FeatureMonitor(monitor.metrics, {m: h.cuts for m, h in monitor.histograms.items()},
+                                  monitor.baseline_version)
+
+    try:
+        os.makedirs(pending_dir, exist_ok=True)
+        name = f'{time.time_ns()}-{os.getpid()}-{threading.get_ident()}.json'
+        tmp_path = os.path.join(pending_dir, f'.{name}.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump({'day': time.strftime('%Y-%m-%d', time.gmtime()), 'monitor': monitor.to_dict()}, f)
+        os.replace(tmp_path, os.path.join(pending_dir, name))
+    except Exception as e:
+        print(f"⚠️ Feature monitor flush failed: {e}", file=sys.stderr)
+        return 0
+    return monitor.n
+
+
+def compact(state_path=MONITOR_STATE_PATH, pending_dir=PENDING_DIR):
+    """Fold pending delta files into the per-day windows of the state file"""
+    with open(MONITOR_LOCK_PATH, 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            names = sorted(n for n in os.listdir(pending_dir) if n.endswith('.json'))
+        except FileNotFoundError:
+            names = []
+        if not names:
+            return 0
+
+        state = load_state(state_path)
+        cutoff = time.strftime('%Y-%m-%d', time.gmtime(time.time() - RETENTION_DAYS * 86400))
+        windows = {(w['day'], w['monitor']['baseline_version']): FeatureMonitor.from_dict(w['monitor'])
+                   for w in state['windows'] if w['day'] >= cutoff}
+        merged = []
+        for name in names:
+            path = os.path.join(pending_dir, name)
+            try:
+                with open(path, 'r') as f:
+                    delta = json.load(f)
+            except ValueError as e:
+                print(f"⚠️ Skipping unreadable feature monitor delta {name}: {e}", file=sys.stderr)
+                merged.append(path)
+                continue
+            monitor = FeatureMonitor.from_dict(delta['monitor'])
+            key = (delta['day'], monitor.baseline_version)
+            if delta['day'] >= cutoff:
+                if key in windows:
+                    windows[key].merge(monitor)
+                else:
+                    windows[key] = monitor
+            merged.append(path)
+
+        state['windows'] = [{'day': day, 'monitor': monitor.to_dict()}
+                            for (day, _), monitor in sorted(windows.items(), key=lambda item: item[0][0])]
+        save_json(state, state_path)
+        # Deltas are removed only once the state that includes them is in place
+        for path in merged:
+            os.remove(path)
+    return len(merged)
+
+
+def population_stability_index(expected, actual, epsilon=1e-4):
+    expected = np.clip(np.asarray(expected, dtype=np.float64), epsilon, None)
+    actual = np.clip(np.asarray(actual, dtype=np.float64), epsilon, None)
+    return float(np.sum((actual - expected) * np.log(actual / expected)))
+
+
+def ks_statistic(sketch_a, sketch_b):
+    """Largest CDF gap between two sketches, checked at every retained value"""
+    points = np.union1d(sketch_a.weighted_items()[0], sketch_b.weighted_items()[0])
+    return float(np.max(np.abs(sketch_a.cdf(points) - sketch_b.cdf(points))))
+
+
+def drift_status(psi):
+    if psi >= PSI_SIGNIFICANT:
+        return 'drift'
+    if psi >= PSI_MODERATE:
+        return 'moderate'
+    return 'stable'
+
+
+def drift_report(baseline, state, days=7):
+    """PSI and KS per metric for the windows of the last ``days`` days"""
+    cutoff = time.strftime('%Y-%m-%d', time.gmtime(time.time() - (days - 1) * 86400))
+    live = FeatureMonitor.from_baseline(baseline)
+    windows = [w for w in state['windows']
+               if w['day'] >= cutoff and w['monitor']['baseline_version'] == baseline['version']]
+    for window in windows:
+        live.merge(FeatureMonitor.from_dict(window['monitor']))
+
+    metrics = {}
+    for metric, expected in baseline['metrics'].items():
+        sketch = live.sketches[metric]
+        if sketch.n == 0:
+            metrics[metric] = {'n': 0, 'status': 'no data'}
+            continue
+        baseline_sketch = QuantileSketch.from_dict(expected['sketch'])
+        psi = population_stability_index(expected['fractions'], live.histograms[metric].fractions())
+        metrics[metric] = {
+            'n': sketch.n,
+            'psi': round(psi, 4),
+            'ks': round(ks_statistic(baseline_sketch, sketch), 4),
+            'status': drift_status(psi),
+            'baseline_quantiles': baseline_sketch.quantiles([0.1, 0.5, 0.9]),
+            'live_quantiles': sketch.quantiles([0.1, 0.5, 0.9])
+        }
+
+    return {
+        'baseline_version': baseline['version'],
+        'days': days,
+        'windows': [w['day'] for w in windows],
+        'metrics': metrics
+    }
+
+
+def build_baseline_from_training_data():
+    """Rebuild the baseline for the deployed model from its training data"""
+    import inference
+    import train_model
+
+    model, scaler, metadata = inference.load_model_artifacts()
+    df = train_model.load_training_data()
+    features = df[metadata['feature_columns']]
+    probabilities = inference.predict_default_probabilities(features.to_dict('records'), model, scaler, metadata)
+    return build_baseline(features, probabilities, metadata['training_date'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Feature drift monitoring')
+    parser.add_argument('command', choices=['baseline', 'report', 'compact'])
+    parser.add_argument('--days', type=int, default=7, help='report over the last N days')
+    args = parser.parse_args()
+
+    if args.command == 'baseline':
+        baseline = build_baseline_from_training_data()
+        save_json(baseline, BASELINE_PATH)
+        print(f"✓ Baseline of {baseline['n']} training rows saved to {BASELINE_PATH}")
+        return
+
+    merged = compact()
+    if args.command == 'compact':
+        print(f"✓ Merged {merged} pending feature monitor deltas")
+        return
+
+    baseline = load_baseline()
+    if baseline is None:
+        print("Error: no feature baseline; run 'python ml/feature_monitor.py baseline'", file=sys.stderr)
+        sys.exit(1)
+    print(json.dumps(drift_report(baseline, load_state(), args.days), indent=2))
+
+
+if __name__ == '__main__':
+    main()
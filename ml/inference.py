@@ -11,7 +11,8 @@ import json
 import numpy as np
 import pandas as pd
 import psycopg2
-from psycopg2.extras import RealDictCursor
+import admission
+import feature_monitor
 
 # Configuration
 MODEL_DIR = 'ml/models'
@@ -23,6 +24,12 @@ DB_CONFIG = {
     'port': os.getenv('DB_PORT', '5432')
 }
 
+def connect(deadline=None):
+    """Open a DB connection whose statements cannot outlive the request deadline"""
+    if deadline is None:
+        return psycopg2.connect(**DB_CONFIG)
+    return psycopg2.connect(**DB_CONFIG, options=f'-c statement_timeout={deadline.statement_timeout_ms()}')
+
 def load_model_artifacts():
     """Load trained model, scaler, and metadata"""
     model_path = os.path.join(MODEL_DIR, 'eligibility_model.pkl')
@@ -40,45 +47,152 @@ def load_model_artifacts():
     
     return model, scaler, metadata
 
-def get_user_transactions(user_id):
+TRANSACTION_TYPES = ['income', 'expense']
+COPY_CHUNK_ROWS = 65536
+
+class TransactionColumnSink:
+    """File-like COPY target that decodes CSV rows into preallocated arrays
+
+    Rows are decoded a chunk at a time, so memory use is the arrays
+    themselves (8 bytes per date, 8 per amount, 1 per type code and 4 per
+    user id) plus one chunk of text.
+    """
+    
+    def __init__(self, capacity, with_user_id=False):
+        self.n = 0
+        self.dates = np.empty(capacity, dtype='datetime64[D]')
+        self.amounts = np.empty(capacity, dtype=np.float64)
+        self.type_codes = np.empty(capacity, dtype=np.int8)
+        self.user_ids = np.empty(capacity, dtype=np.int32) if with_user_id else None
+        self._pending = []
+        self._tail = ''
+    
+    def _grow(self, needed):
+        capacity = max(needed, 2 * len(self.amounts))
+        self.dates = np.resize(self.dates, capacity)
+        self.amounts = np.resize(self.amounts, capacity)
+        self.type_codes = np.resize(self.type_codes, capacity)
+        if self.user_ids is not None:
+            self.user_ids = np.resize(self.user_ids, capacity)
+    
+    def _decode(self):
+        if not self._pending:
+            return
+        columns = list(zip(*[line.split(',') for line in self._pending]))
+        self._pending = []
+        if self.user_ids is not None:
+            user_ids, columns = columns[0], columns[1:]
+        start, end = self.n, self.n + len(columns[0])
+        if end > len(self.amounts):
+            self._grow(end)
+        self.dates[start:end] = np.array(columns[0], dtype='datetime64[D]')
+        self.amounts[start:end] = np.array(columns[1], dtype=np.float64)
+        self.type_codes[start:end] = np.array(columns[2], dtype=np.int8)
+        if self.user_ids is not None:
+            self.user_ids[start:end] = np.array(user_ids, dtype=np.int32)
+        self.n = end
+    
+    def write(self, data):
+        if isinstance(data, bytes):
+            data = data.decode()
+        lines = (self._tail + data).split('\n')
+        self._tail = lines.pop()
+        self._pending.extend(lines)
+        if len(self._pending) >= COPY_CHUNK_ROWS:
+            self._decode()
+    
+    def to_dataframe(self):
+        """Trimmed columns as a DataFrame with a categorical ``type``"""
+        if self._tail:
+            self._pending.append(self._tail)
+            self._tail = ''
+        self._decode()
+        columns = {
+            'date': self.dates[:self.n],
+            'amount': self.amounts[:self.n],
+            'type': pd.Categorical.from_codes(self.type_codes[:self.n], TRANSACTION_TYPES)
+        }
+        if self.user_ids is not None:
+            columns = {'user_id': self.user_ids[:self.n], **columns}
+        return pd.DataFrame(columns)
+
+def fetch_transaction_columns(conn, user_ids, with_user_id=True):
+    """Stream transactions for ``user_ids`` with COPY straight into typed arrays"""
+    user_ids = [int(user_id) for user_id in user_ids]
+    cursor = conn.cursor()
+    
+    # Exact row count so the arrays are allocated once
+    cursor.execute('SELECT COUNT(*) FROM transactions WHERE user_id = ANY(%s)', (user_ids,))
+    sink = TransactionColumnSink(cursor.fetchone()[0], with_user_id=with_user_id)
+    
+    # Dates, amounts and type codes are rendered by the server in a fixed format
+    query = cursor.mogrify("""
+        SELECT {user_column}
+               to_char(date, 'YYYY-MM-DD'),
+               amount,
+               CASE WHEN type = 'income' THEN 0 ELSE 1 END
+        FROM transactions
+        WHERE user_id = ANY(%s)
+        ORDER BY {order}
+    """.format(
+        user_column='user_id,' if with_user_id else '',
+        order='user_id, date' if with_user_id else 'date'
+    ), (user_ids,)).decode()
+    cursor.copy_expert(f'COPY ({query}) TO STDOUT WITH (FORMAT csv)', sink)
+    cursor.close()
+    
+    return sink.to_dataframe()
+
+def get_user_transactions(user_id, conn=None):
     """Fetch user transactions from database"""
+    own_conn = conn is None
     try:
-        conn = psycopg2.connect(**DB_CONFIG)
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        if own_conn:
+            conn = psycopg2.connect(**DB_CONFIG)
         
-        query = """
-            SELECT date, amount, type, category
-            FROM transactions
-            WHERE user_id = %s
-            ORDER BY date
-        """
-        cursor.execute(query, (user_id,))
-        transactions = cursor.fetchall()
+        df_transactions = fetch_transaction_columns(conn, [user_id], with_user_id=False)
         
-        cursor.close()
-        conn.close()
+        if own_conn:
+            conn.close()
         
-        return pd.DataFrame(transactions)
+        return df_transactions if not df_transactions.empty else pd.DataFrame()
+    except psycopg2.errors.QueryCanceled:
+        # A statement timeout means the deadline passed, not that there is no data
+        raise
     except Exception as e:
         print(f"Database error: {e}", file=sys.stderr)
         return pd.DataFrame()
 
-def calculate_financial_features(df_transactions):
+def get_users_transactions(user_ids, conn):
+    """Fetch transactions for many users in one query, with a user_id column"""
+    return fetch_transaction_columns(conn, user_ids)
+
+def calculate_monthly_aggregates(df_transactions):
+    """Aggregate transactions into monthly income, expenses and net cashflow"""
+    months = df_transactions['date'].to_numpy().astype('datetime64[M]')
+    amounts = df_transactions['amount'].to_numpy(dtype=np.float64)
+    is_income = (df_transactions['type'] == 'income').to_numpy()
+    is_expense = (df_transactions['type'] == 'expense').to_numpy()
+    
+    unique_months, month_index = np.unique(months, return_inverse=True)
+    monthly_data = pd.DataFrame({
+        'month': pd.PeriodIndex(unique_months, freq='M'),
+        'income': np.bincount(month_index, weights=amounts * is_income, minlength=len(unique_months)),
+        'expenses': np.bincount(month_index, weights=amounts * is_expense, minlength=len(unique_months))
+    })
+    
+    monthly_data['net_cashflow'] = monthly_data['income'] - monthly_data['expenses']
+    
+    return monthly_data
+
+def calculate_financial_features(df_transactions, monthly_data=None):
     """Calculate financial features from transaction history"""
     if df_transactions.empty:
         return None
     
     # Monthly aggregation
-    df_transactions['month'] = pd.to_datetime(df_transactions['date']).dt.to_period('M')
-    
-    monthly_data = df_transactions.groupby('month').apply(
-        lambda x: pd.Series({
-            'income': x[x['type'] == 'income']['amount'].sum(),
-            'expenses': x[x['type'] == 'expense']['amount'].sum()
-        })
-    ).reset_index()
-    
-    monthly_data['net_cashflow'] = monthly_data['income'] - monthly_data['expenses']
+    if monthly_data is None:
+        monthly_data = calculate_monthly_aggregates(df_transactions)
     
     # Calculate features
     avg_monthly_income = monthly_data['income'].mean()
@@ -119,13 +233,20 @@ def calculate_financial_features(df_transactions):
     
     return features
 
-def predict_eligibility(user_id):
+def predict_eligibility(user_id, deadline=None):
     """Predict loan eligibility score for a user"""
     # Load model
     model, scaler, metadata = load_model_artifacts()
     
     # Get user data
-    df_transactions = get_user_transactions(user_id)
+    if deadline is None:
+        df_transactions = get_user_transactions(user_id)
+    else:
+        conn = connect(deadline)
+        try:
+            df_transactions = get_user_transactions(user_id, conn)
+        finally:
+            conn.close()
     
     if df_transactions.empty:
         return {
@@ -150,20 +271,34 @@ def predict_eligibility(user_id):
             'error': 'Feature calculation failed'
         }
     
-    # Prepare feature vector
-    feature_values = [features[col] for col in metadata['feature_columns']]
-    X = np.array(feature_values).reshape(1, -1)
+    return score_features(features, model, scaler, metadata)
+
+def predict_default_probabilities(feature_rows, model, scaler, metadata):
+    """Predict default probabilities for many feature dicts in one model call"""
+    # Prepare feature matrix
+    X = np.array([[features[col] for col in metadata['feature_columns']] for features in feature_rows],
+                 dtype=float).reshape(-1, len(metadata['feature_columns']))
     
+    return predict_default_matrix(X, model, scaler, metadata)
+
+def predict_default_matrix(X, model, scaler, metadata):
+    """Predict default probabilities for a matrix in feature_columns order"""
     # Scale features if model is LogisticRegression
     if 'Logistic' in metadata['model_type']:
         X = scaler.transform(X)
     
+    return model.predict_proba(X)[:, 1]
+
+def score_features(features, model, scaler, metadata, default_probability=None):
+    """Score a feature dict with a loaded model and explain the result"""
     # Predict
-    default_probability = model.predict_proba(X)[0][1]
+    if default_probability is None:
+        default_probability = predict_default_probabilities([features], model, scaler, metadata)[0]
+    feature_monitor.record(features, default_probability)
     
     # Convert to eligibility score (inverse of default probability)
     eligibility_score = int((1 - default_probability) * 100)
-    eligibility_score = np.clip(eligibility_score, 0, 100)
+    eligibility_score = int(np.clip(eligibility_score, 0, 100))
     
     # Determine risk level
     if eligibility_score >= 70:
@@ -200,11 +335,40 @@ def predict_eligibility(user_id):
         'features': features
     }
 
-def calculate_health_score(user_id):
+def score_users(user_ids, conn, model, scaler, metadata):
+    """Score many users with one transaction query and one model call
+
+    Returns ``{user_id: (eligibility_result, health_result)}`` for the users
+    that have transaction history.
+    """
+    df_transactions = get_users_transactions(user_ids, conn)
+    
+    scored_ids = []
+    feature_rows = []
+    for user_id, df_user in df_transactions.groupby('user_id', sort=True):
+        features = calculate_financial_features(df_user.copy())
+        if features is None:
+            continue
+        scored_ids.append(int(user_id))
+        feature_rows.append({name: float(value) for name, value in features.items()})
+    
+    if not feature_rows:
+        return {}
+    
+    probabilities = predict_default_probabilities(feature_rows, model, scaler, metadata)
+    results = {}
+    for user_id, features, probability in zip(scored_ids, feature_rows, probabilities):
+        eligibility_result = score_features(features, model, scaler, metadata, default_probability=probability)
+        results[user_id] = (eligibility_result, health_from_eligibility(eligibility_result))
+    return results
+
+def calculate_health_score(user_id, deadline=None):
     """Calculate comprehensive financial health score"""
     # Get eligibility score first
-    eligibility_result = predict_eligibility(user_id)
-    
+    return health_from_eligibility(predict_eligibility(user_id, deadline))
+
+def health_from_eligibility(eligibility_result):
+    """Derive the financial health score from an eligibility result"""
     if 'error' in eligibility_result:
         return {
             'health_score': 35,
@@ -259,20 +423,57 @@ def calculate_health_score(user_id):
         }
     }
 
+OVERLOAD_FALLBACK = {
+    'eligibility': {
+        'eligibility_score': 30,
+        'risk_level': 'HIGH',
+        'factors': [
+            {'factor': 'Service Load', 'impact': 'Score temporarily unavailable'}
+        ]
+    },
+    'health': health_from_eligibility({'eligibility_score': 30, 'error': 'Service overloaded'})
+}
+
+def score_admitted(command, user_id, deadline=None):
+    """Run one CLI scoring request under admission control
+
+    Shed or timed-out requests get the user's last good result (or the
+    fallback scores) marked ``degraded`` instead of waiting without bound.
+    """
+    deadline = deadline or admission.Deadline()
+    score = predict_eligibility if command == 'eligibility' else calculate_health_score
+    try:
+        with admission.admit(deadline):
+            result = score(user_id, deadline)
+    except admission.Overloaded as e:
+        return admission.degraded_result(command, user_id, e.reason, OVERLOAD_FALLBACK[command])
+    except psycopg2.errors.QueryCanceled:
+        admission.record_event('deadline_exceeded')
+        return admission.degraded_result(command, user_id, 'deadline_exceeded', OVERLOAD_FALLBACK[command])
+    except psycopg2.OperationalError as e:
+        print(f"Database error: {e}", file=sys.stderr)
+        return admission.degraded_result(command, user_id, 'database_unavailable', OVERLOAD_FALLBACK[command])
+    
+    if 'error' not in result:
+        admission.save_cached_result(command, user_id, result)
+    return result
+
 def main():
     """Main entry point for command-line usage"""
+    if len(sys.argv) == 2 and sys.argv[1] == 'stats':
+        print(json.dumps(admission.admission_stats()))
+        return
+    
     if len(sys.argv) < 3:
-        print("Usage: python inference.py <eligibility|health> <user_id>")
+        print("Usage: python inference.py <eligibility|health> <user_id> | stats")
         sys.exit(1)
     
     command = sys.argv[1]
     user_id = int(sys.argv[2])
     
     try:
-        if command == 'eligibility':
-            result = predict_eligibility(user_id)
-        elif command == 'health':
-            result = calculate_health_score(user_id)
+        if command in ('eligibility', 'health'):
+            result = score_admitted(command, user_id)
         else:
             print(f"Unknown command: {command}")
             sys.exit(1)
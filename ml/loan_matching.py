@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+FinBridge Loan Matching Engine
+Vectorized user x product eligibility and ranking over loan_products
+"""
+
+import numpy as np
+from psycopg2.extras import RealDictCursor
+
+PRODUCT_COLUMNS = """
+    id, lender_name, min_amount, max_amount, interest_rate,
+    min_tenure, max_tenure, constraints, is_active, updated_at
+"""
+
+
+class LoanMatcher:
+    """Active loan products held as arrays for broadcast eligibility checks
+
+    Constraints come from the ``constraints`` JSONB column; a missing
+    ``min_income`` or ``min_health_score`` never excludes a user and a
+    missing ``max_debt_ratio`` allows any ratio.
+    """
+
+    NUMERIC_FIELDS = ('min_amount', 'max_amount', 'interest_rate', 'min_tenure', 'max_tenure',
+                      'min_income', 'max_debt_ratio', 'min_health_score')
+
+    def __init__(self, products=()):
+        self.products = {}
+        self.last_updated_at = None
+        for product in products:
+            self._upsert(product)
+        self._rebuild()
+
+    @staticmethod
+    def _normalize(product):
+        constraints = product.get('constraints') or {}
+        max_debt_ratio = constraints.get('max_debt_ratio')
+        return {
+            'id': int(product['id']),
+            'lender_name': product['lender_name'],
+            'min_amount': float(product['min_amount']),
+            'max_amount': float(product['max_amount']),
+            'interest_rate': float(product['interest_rate']),
+            'min_tenure': int(product['min_tenure']),
+            'max_tenure': int(product['max_tenure']),
+            'min_income': float(constraints.get('min_income') or 0),
+            'max_debt_ratio': float(max_debt_ratio) if max_debt_ratio is not None else np.inf,
+            'min_health_score': float(constraints.get('min_health_score') or 0)
+        }
+
+    def _upsert(self, product):
+        if product.get('is_active', True):
+            self.products[int(product['id'])] = self._normalize(product)
+        else:
+            self.products.pop(int(product['id']), None)
+        updated_at = product.get('updated_at')
+        if updated_at is not None and (self.last_updated_at is None or updated_at > self.last_updated_at):
+            self.last_updated_at = updated_at
+
+    def _rebuild(self):
+        """Lay the products out as arrays, sorted by interest rate (best first)"""
+        rows = sorted(self.products.values(), key=lambda p: (p['interest_rate'], p['id']))
+        self.ids = np.array([p['id'] for p in rows], dtype=np.int64)
+        self.lender_names = [p['lender_name'] for p in rows]
+        for field in self.NUMERIC_FIELDS:
+            setattr(self, field, np.array([p[field] for p in rows], dtype=np.float64))
+
+    @classmethod
+    def load(cls, conn):
+        """Load all active products"""
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        cursor.execute(f'SELECT {PRODUCT_COLUMNS} FROM loan_products WHERE is_active = true')
+        matcher = cls(cursor.fetchall())
+        cursor.close()
+        return matcher
+
+    def refresh(self, conn):
+        """Apply products changed since the last load; returns True if anything changed
+
+        Rows are picked up by ``updated_at``, which the schema trigger bumps
+        on every update. Deleted rows leave no trace, so a count mismatch
+        afterwards triggers a full reload.
+        """
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        if self.last_updated_at is None:
+            cursor.execute(f'SELECT {PRODUCT_COLUMNS} FROM loan_products')
+        else:
+            cursor.execute(f'SELECT {PRODUCT_COLUMNS} FROM loan_products WHERE updated_at > %s',
+                           (self.last_updated_at,))
+        changed = cursor.fetchall()
+        for product in changed:
+            self._upsert(product)
+
+        cursor.execute('SELECT COUNT(*) AS n FROM loan_products WHERE is_active = true')
+        n_active = cursor.fetchone()['n']
+        if n_active != len(self.products):
+            cursor.execute(f'SELECT {PRODUCT_COLUMNS} FROM loan_products WHERE is_active = true')
+            self.products = {}
+            for product in cursor.fetchall():
+                self._upsert(product)
+            changed = True
+        cursor.close()
+
+        if changed:
+            self._rebuild()
+        return bool(changed)
+
+    def eligibility_mask(self, income, debt_ratio, health_score, requested_amount=None, tenure=None):
+        """Boolean (n_users, n_products) mask of products each user qualifies for
+
+        All user inputs are scalars or arrays of length n_users; amount and
+        tenure are optional and only checked when given.
+        """
+        income = np.atleast_1d(np.asarray(income, dtype=np.float64))[:, None]
+        debt_ratio = np.atleast_1d(np.asarray(debt_ratio, dtype=np.float64))[:, None]
+        health_score = np.atleast_1d(np.asarray(health_score, dtype=np.float64))[:, None]
+
+        mask = (
+            (income >= self.min_income)
+            & (debt_ratio <= self.max_debt_ratio)
+            & (health_score >= self.min_health_score)
+        )
+        if requested_amount is not None:
+            amount = np.atleast_1d(np.asarray(requested_amount, dtype=np.float64))[:, None]
+            mask &= (amount >= self.min_amount) & (amount <= self.max_amount)
+        if tenure is not None:
+            tenure = np.atleast_1d(np.asarray(tenure, dtype=np.float64))[:, None]
+            mask &= (tenure >= self.min_tenure) & (tenure <= self.max_tenure)
+        return mask
+
+    def rank(self, mask):
+        """Per-user product positions, eligible first by interest rate, and eligible counts
+
+        Products are stored sorted by rate, so a stable sort on the negated
+        mask keeps the rate order within the eligible block.
+        """
+        order = np.argsort(~mask, axis=1, kind='stable')
+        return order, mask.sum(axis=1)
+
+    def match_users(self, user_matrix, requested_amount=None, tenure=None):
+        """Match a (n_users, 3) matrix of income, debt ratio and health score"""
+        user_matrix = np.asarray(user_matrix, dtype=np.float64).reshape(-1, 3)
+        mask = self.eligibility_mask(user_matrix[:, 0], user_matrix[:, 1], user_matrix[:, 2],
+                                     requested_amount, tenure)
+        return mask, *self.rank(mask)
+
+    def product(self, position):
+        """Product record at an array position"""
+        return {
+            'id': int(self.ids[position]),
+            'lender_name': self.lender_names[position],
+            'min_amount': float(self.min_amount[position]),
+            'max_amount': float(self.max_amount[position]),
+            'interest_rate': float(self.interest_rate[position]),
+            'min_tenure': int(self.min_tenure[position]),
+            'max_tenure': int(self.max_tenure[position])
+        }
+
+    def recommend(self, income, debt_ratio, health_score, top_k=3, requested_amount=None, tenure=None):
+        """Best eligible products for a single user"""
+        mask = self.eligibility_mask(income, debt_ratio, health_score, requested_amount, tenure)
+        order, n_eligible = self.rank(mask)
+        return [self.product(position) for position in order[0, :min(top_k, n_eligible[0])]]
@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+"""
+FinBridge Population Scoring
+Resumable re-scoring of every user, e.g. after a model promotion
+
+A run splits users into shards of consecutive user-id ranges, recorded in
+scoring_shards. Worker processes - on this machine or in any number of ML
+containers running the same command - claim one shard at a time with a
+lease (FOR UPDATE SKIP LOCKED), so no two workers hold the same shard.
+Each batch's scores are committed in the same transaction as the shard's
+checkpoint and a lease renewal. A shard whose worker dies is reclaimed
+when its lease expires and continues after its last checkpointed user,
+and a restarted job resumes the unfinished run for the same model version.
+
+Usage:
+    python ml/population_scoring.py [--workers N] [--shard-size N] [--new-run]
+    python ml/population_scoring.py --status
+    docker compose run --rm ml-scheduler python population_scoring.py   (once per extra container)
+"""
+
+import argparse
+import json
+import os
+import socket
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import psycopg2
+
+import feature_monitor
+import inference
+from rescore_scheduler import model_version, write_scores
+
+# Configuration
+SHARD_SIZE = 5000
+BATCH_SIZE = 200
+MAX_WORKERS = 4
+LEASE_SECONDS = 300
+# Serializes run creation between containers starting at the same time
+RUN_LOCK_KEY = 7240
+
+
+def start_run(conn, version, shard_size=SHARD_SIZE, new_run=False):
+    """Resume the unfinished run for ``version``, or create one with its shards"""
+    cursor = conn.cursor()
+    cursor.execute('SELECT pg_advisory_xact_lock(%s)', (RUN_LOCK_KEY,))
+    if not new_run:
+        cursor.execute("""
+            SELECT id FROM scoring_runs
+            WHERE model_version = %s AND status = 'RUNNING'
+            ORDER BY id DESC LIMIT 1
+        """, (version,))
+        row = cursor.fetchone()
+        if row:
+            conn.commit()
+            cursor.close()
+            return row[0], False
+
+    cursor.execute('SELECT MIN(id), MAX(id) FROM users')
+    min_id, max_id = cursor.fetchone()
+    cursor.execute('INSERT INTO scoring_runs (model_version, shard_size) VALUES (%s, %s) RETURNING id',
+                   (version, shard_size))
+    run_id = cursor.fetchone()[0]
+    if min_id is not None:
+        cursor.execute("""
+            INSERT INTO scoring_shards (run_id, shard_id, min_user_id, max_user_id)
+            SELECT %s, n, %s + n * %s, LEAST(%s + (n + 1) * %s - 1, %s)
+            FROM generate_series(0, (%s - %s) / %s) AS n
+        """, (run_id, min_id, shard_size, min_id, shard_size, max_id, max_id, min_id, shard_size))
+    conn.commit()
+    cursor.close()
+    return run_id, True
+
+
+def claim_shard(conn, run_id, owner, lease_seconds=LEASE_SECONDS):
+    """Lease the next pending shard, or one whose lease expired; None when none are left"""
+    cursor = conn.cursor()
+    cursor.execute("""
+        UPDATE scoring_shards s
+        SET status = 'RUNNING',
+            lease_owner = %s,
+            lease_expires_at = CURRENT_TIMESTAMP + %s * INTERVAL '1 second',
+            attempts = s.attempts + 1
+        FROM (
+            SELECT run_id, shard_id
+            FROM scoring_shards
+            WHERE run_id = %s
+              AND (status = 'PENDING' OR (status = 'RUNNING' AND lease_expires_at < CURRENT_TIMESTAMP))
+            ORDER BY shard_id
+            LIMIT 1
+            FOR UPDATE SKIP LOCKED
+        ) next_shard
+        WHERE s.run_id = next_shard.run_id AND s.shard_id = next_shard.shard_id
+        RETURNING s.shard_id, s.min_user_id, s.max_user_id, s.last_user_id, s.users_scored, s.attempts
+    """, (owner, lease_seconds, run_id))
+    row = cursor.fetchone()
+    conn.commit()
+    cursor.close()
+    if row is None:
+        return None
+    return dict(zip(('shard_id', 'min_user_id', 'max_user_id', 'last_user_id', 'users_scored', 'attempts'), row))
+
+
+def checkpoint(cursor, run_id, shard_id, owner, last_user_id, n_scored, lease_seconds=LEASE_SECONDS):
+    """Advance the shard checkpoint and renew the lease; False if the lease was lost
+
+    Runs in the caller's transaction, so it commits together with the scores.
+    """
+    cursor.execute("""
+        UPDATE scoring_shards
+        SET last_user_id = %s,
+            users_scored = users_scored + %s,
+            lease_expires_at = CURRENT_TIMESTAMP + %s * INTERVAL '1 second'
+        WHERE run_id = %s AND shard_id = %s AND lease_owner = %s AND status = 'RUNNING'
+    """, (last_user_id, n_scored, lease_seconds, run_id, shard_id, owner))
+    return cursor.rowcount == 1
+
+
+def score_shard(conn, run_id, shard, owner, artifacts, version, batch_size=BATCH_SIZE,
+                lease_seconds=LEASE_SECONDS):
+    """Score a leased shard from its checkpoint; returns users scored, or None if the lease was lost"""
+    started = time.perf_counter()
+    start_after = shard['last_user_id'] if shard['last_user_id'] is not None else shard['min_user_id'] - 1
+
+    cursor = conn.cursor()
+    cursor.execute('SELECT id FROM users WHERE id > %s AND id <= %s ORDER BY id',
+                   (start_after, shard['max_user_id']))
+    user_ids = [row[0] for row in cursor.fetchall()]
+    conn.commit()
+
+    scored_total = 0
+    for i in range(0, len(user_ids), batch_size):
+        batch = user_ids[i:i + batch_size]
+        scored = inference.score_users(batch, conn, *artifacts)
+        if not checkpoint(cursor, run_id, shard['shard_id'], owner, batch[-1], len(scored), lease_seconds):
+            conn.rollback()
+            cursor.close()
+            print(f"⚠️ Lost the lease on shard {shard['shard_id']}; another worker took it over", file=sys.stderr)
+            return None
+        # write_scores commits the scores and the checkpoint together
+        if scored:
+            write_scores(conn, scored, version)
+        else:
+            conn.commit()
+        scored_total += len(scored)
+
+        done = i + len(batch)
+        elapsed = time.perf_counter() - started
+        rate = done / elapsed if elapsed > 0 else 0.0
+        eta = (len(user_ids) - done) / rate if rate > 0 else 0.0
+        print(f"  shard {shard['shard_id']}: {done}/{len(user_ids)} users, "
+              f"{rate:.1f} users/s, ETA {eta:.0f}s", flush=True)
+
+    cursor.execute("""
+        UPDATE scoring_shards
+        SET status = 'DONE',
+            elapsed_seconds = COALESCE(elapsed_seconds, 0) + %s,
+            completed_at = CURRENT_TIMESTAMP,
+            lease_expires_at = NULL
+        WHERE run_id = %s AND shard_id = %s AND lease_owner = %s
+    """, (time.perf_counter() - started, run_id, shard['shard_id'], owner))
+    conn.commit()
+    cursor.close()
+    return scored_total
+
+
+def run_worker(run_id, worker_index, batch_size=BATCH_SIZE, lease_seconds=LEASE_SECONDS):
+    """Claim and score shards until none are left (runs in a worker process)"""
+    owner = f'{socket.gethostname()}:{os.getpid()}:{worker_index}'
+    artifacts = inference.load_model_artifacts()
+    version = model_version(artifacts[2])
+    conn = psycopg2.connect(**inference.DB_CONFIG)
+    shards = 0
+    users = 0
+    try:
+        while True:
+            shard = claim_shard(conn, run_id, owner, lease_seconds)
+            if shard is None:
+                break
+            started = time.perf_counter()
+            resumed = f" (resuming after user {shard['last_user_id']})" if shard['last_user_id'] is not None else ''
+            print(f"→ {owner} claimed shard {shard['shard_id']} "
+                  f"[users {shard['min_user_id']}-{shard['max_user_id']}]{resumed}", flush=True)
+            scored = score_shard(conn, run_id, shard, owner, artifacts, version, batch_size, lease_seconds)
+            # Pool workers exit without running atexit handlers
+            feature_monitor.flush()
+            if scored is None:
+                continue
+            elapsed = time.perf_counter() - started
+            print(f"✓ Shard {shard['shard_id']} done: {scored} users in {elapsed:.1f}s "
+                  f"({scored / elapsed if elapsed > 0 else 0:.1f} users/s)", flush=True)
+            shards += 1
+            users += scored
+    finally:
+        conn.close()
+    return {'shards': shards, 'users': users}
+
+
+def run_status(conn, run_id):
+    """Shard counts, users scored, throughput and an ETA for the whole run"""
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT
+            COUNT(*),
+            COUNT(*) FILTER (WHERE status = 'DONE'),
+            COUNT(*) FILTER (WHERE status = 'RUNNING' AND lease_expires_at >= CURRENT_TIMESTAMP),
+            COALESCE(SUM(users_scored), 0),
+            AVG(elapsed_seconds) FILTER (WHERE status = 'DONE'),
+            COALESCE(SUM(elapsed_seconds) FILTER (WHERE status = 'DONE'), 0),
+            COALESCE(SUM(users_scored) FILTER (WHERE status = 'DONE'), 0)
+        FROM scoring_shards
+        WHERE run_id = %s
+    """, (run_id,))
+    total, done, running, users_scored, avg_shard_seconds, done_seconds, done_users = cursor.fetchone()
+    cursor.close()
+
+    remaining = total - done
+    eta = None
+    if avg_shard_seconds is not None:
+        eta = remaining * avg_shard_seconds / max(running, 1)
+    return {
+        'run_id': run_id,
+        'shards_total': total,
+        'shards_done': done,
+        'shards_running': running,
+        'users_scored': users_scored,
+        'users_per_second_per_worker': done_users / done_seconds if done_seconds > 0 else None,
+        'eta_seconds': eta
+    }
+
+
+def complete_run_if_done(conn, run_id):
+    cursor = conn.cursor()
+    cursor.execute("""
+        UPDATE scoring_runs SET status = 'COMPLETED', completed_at = CURRENT_TIMESTAMP
+        WHERE id = %s AND status = 'RUNNING'
+          AND NOT EXISTS (SELECT 1 FROM scoring_shards WHERE run_id = %s AND status <> 'DONE')
+    """, (run_id, run_id))
+    completed = cursor.rowcount == 1
+    conn.commit()
+    cursor.close()
+    return completed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Resumable full-population scoring')
+    parser.add_argument('--workers', type=int, default=MAX_WORKERS)
+    parser.add_argument('--shard-size', type=int, default=SHARD_SIZE, help='user ids per shard')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--lease', type=float, default=LEASE_SECONDS, help='shard lease in seconds')
+    parser.add_argument('--new-run', action='store_true', help='start over instead of resuming')
+    parser.add_argument('--status', action='store_true', help='print progress of the current run and exit')
+    args = parser.parse_args()
+
+    version = model_version(inference.load_model_artifacts()[2])
+    conn = psycopg2.connect(**inference.DB_CONFIG)
+    try:
+        if args.status:
+            cursor = conn.cursor()
+            cursor.execute('SELECT id FROM scoring_runs WHERE model_version = %s ORDER BY id DESC LIMIT 1',
+                           (version,))
+            row = cursor.fetchone()
+            cursor.close()
+            if row is None:
+                print(f"No scoring run for model {version}", file=sys.stderr)
+                sys.exit(1)
+            print(json.dumps(run_status(conn, row[0])))
+            return
+
+        run_id, created = start_run(conn, version, args.shard_size, args.new_run)
+        status = run_status(conn, run_id)
+    finally:
+        # Closed before forking so no worker inherits the connection
+        conn.close()
+    print(f"{'Started' if created else 'Resuming'} scoring run {run_id} for model {version}: "
+          f"{status['shards_done']}/{status['shards_total']} shards done", flush=True)
+
+    started = time.perf_counter()
+    users = 0
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        futures = [pool.submit(run_worker, run_id, i, args.batch_size, args.lease)
+                   for i in range(args.workers)]
+        for future in as_completed(futures):
+            try:
+                users += future.result()['users']
+            except Exception as e:
+                print(f"Worker error: {e}", file=sys.stderr, flush=True)
+    elapsed = time.perf_counter() - started
+
+    conn = psycopg2.connect(**inference.DB_CONFIG)
+    try:
+        status = run_status(conn, run_id)
+        completed = complete_run_if_done(conn, run_id)
+    finally:
+        conn.close()
+    print(f"✓ Scored {users} users in {elapsed:.1f}s ({users / elapsed if elapsed > 0 else 0:.1f} users/s); "
+          f"{status['shards_done']}/{status['shards_total']} shards done", flush=True)
+    if completed:
+        print(f"✓ Scoring run {run_id} completed")
+    else:
+        print(f"⚠️ Run {run_id} has unfinished shards; rerun to resume them", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+FinBridge Re-scoring Scheduler
+Keeps model_scores fresh by re-scoring users whose transactions changed
+
+A watermark on transactions.id bounds each scan to rows added since the
+previous run. Ids are assigned at insert, not at commit, so a row can
+become visible after a higher id was already scanned: the watermark only
+moves past ids whose rows are older than a safety lag, and each pass
+re-scans the trailing lag. A user is dirty when their latest model_scores
+row is not at least the safety lag newer than their newest transaction,
+so a score that may have raced an uncommitted row is redone. Dirty users
+are scored in chunked batches with bounded concurrency and a rate limit,
+and written with bulk inserts.
+
+Usage:
+    python ml/rescore_scheduler.py [--once] [--interval SECONDS]
+"""
+
+import argparse
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import psycopg2
+from psycopg2.extras import Json, execute_values
+
+import feature_monitor
+import inference
+
+# Configuration
+WATERMARK_NAME = 'model_scores'
+BATCH_SIZE = 200
+MAX_WORKERS = 4
+MAX_USERS_PER_SECOND = 50
+POLL_INTERVAL_SECONDS = 60
+# Longest a transactions insert is expected to stay uncommitted
+SAFETY_LAG_SECONDS = 120
+
+
+class RateLimiter:
+    """Token bucket shared by the worker threads (users per second)"""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, n=1):
+        n = min(n, self.capacity)
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= n:
+                    self.tokens -= n
+                    return
+                wait = (n - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def model_version(metadata):
+    """Identify the scoring model in model_scores.model_version"""
+    return metadata.get('training_date', metadata['model_type'])[:50]
+
+
+def load_watermark(conn, name=WATERMARK_NAME):
+    cursor = conn.cursor()
+    cursor.execute('SELECT last_transaction_id FROM rescore_watermarks WHERE name = %s', (name,))
+    row = cursor.fetchone()
+    cursor.close()
+    return row[0] if row else 0
+
+
+def save_watermark(conn, last_transaction_id, name=WATERMARK_NAME):
+    cursor = conn.cursor()
+    cursor.execute("""
+        INSERT INTO rescore_watermarks (name, last_transaction_id, updated_at)
+        VALUES (%s, %s, CURRENT_TIMESTAMP)
+        ON CONFLICT (name) DO UPDATE
+        SET last_transaction_id = EXCLUDED.last_transaction_id,
+            updated_at = EXCLUDED.updated_at
+    """, (name, last_transaction_id))
+    conn.commit()
+    cursor.close()
+
+
+def settled_watermark(conn, after_id, up_to_id, safety_lag=SAFETY_LAG_SECONDS):
+    """Highest id in [after_id, up_to_id] below every row created within the safety lag"""
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT MIN(id) - 1
+        FROM transactions
+        WHERE id > %s AND id <= %s
+          AND created_at >= CURRENT_TIMESTAMP - make_interval(secs => %s)
+    """, (after_id, up_to_id, safety_lag))
+    recent = cursor.fetchone()[0]
+    cursor.close()
+    return up_to_id if recent is None else recent
+
+
+def find_dirty_users(conn, after_id, up_to_id, safety_lag=SAFETY_LAG_SECONDS):
+    """Users with transactions in (after_id, up_to_id] not covered by their latest score"""
+    cursor = conn.cursor()
+    cursor.execute("""
+        WITH changed AS (
+            SELECT user_id, MAX(created_at) AS last_transaction_at
+            FROM transactions
+            WHERE id > %s AND id <= %s
+            GROUP BY user_id
+        )
+        SELECT c.user_id
+        FROM changed c
+        LEFT JOIN LATERAL (
+            SELECT created_at
+            FROM model_scores ms
+            WHERE ms.user_id = c.user_id
+            ORDER BY created_at DESC
+            LIMIT 1
+        ) latest ON true
+        WHERE latest.created_at IS NULL
+           OR latest.created_at < c.last_transaction_at + make_interval(secs => %s)
+        ORDER BY c.user_id
+    """, (after_id, up_to_id, safety_lag))
+    user_ids = [row[0] for row in cursor.fetchall()]
+    cursor.close()
+    return user_ids
+
+
+def write_scores(conn, scored, version):
+    """Bulk insert one new latest model_scores row per scored user"""
+    rows = [
+        (
+            user_id,
+            eligibility['eligibility_score'],
+            health['health_score'],
+            eligibility['risk_level'],
+            version,
+            Json(eligibility['features'])
+        )
+        for user_id, (eligibility, health) in scored.items()
+    ]
+    if not rows:
+        return 0
+    cursor = conn.cursor()
+    execute_values(cursor, """
+        INSERT INTO model_scores
+            (user_id, eligibility_score, health_score, risk_level, model_version, features)
+        VALUES %s
+    """, rows)
+    conn.commit()
+    cursor.close()
+    return len(rows)
+
+
+def score_batch(user_ids, artifacts, version, rate_limiter):
+    """Score and persist one chunk of users on its own connection"""
+    rate_limiter.acquire(len(user_ids))
+    conn = psycopg2.connect(**inference.DB_CONFIG)
+    try:
+        scored = inference.score_users(user_ids, conn, *artifacts)
+        return write_scores(conn, scored, version)
+    finally:
+        conn.close()
+
+
+def run_once(batch_size=BATCH_SIZE, max_workers=MAX_WORKERS, max_users_per_second=MAX_USERS_PER_SECOND):
+    """Re-score every dirty user once; returns a summary of the pass"""
+    started = time.perf_counter()
+    artifacts = inference.load_model_artifacts()
+    version = model_version(artifacts[2])
+
+    conn = psycopg2.connect(**inference.DB_CONFIG)
+    try:
+        after_id = load_watermark(conn)
+        cursor = conn.cursor()
+        cursor.execute('SELECT COALESCE(MAX(id), 0) FROM transactions')
+        up_to_id = cursor.fetchone()[0]
+        cursor.close()
+        dirty = find_dirty_users(conn, after_id, up_to_id) if up_to_id > after_id else []
+
+        batches = [dirty[i:i + batch_size] for i in range(0, len(dirty), batch_size)]
+        rate_limiter = RateLimiter(max_users_per_second, burst=max(batch_size, max_users_per_second))
+        written = 0
+        failed = 0
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            futures = [pool.submit(score_batch, batch, artifacts, version, rate_limiter) for batch in batches]
+            for future in as_completed(futures):
+                try:
+                    written += future.result()
+                except Exception as e:
+                    failed += 1
+                    print(f"Batch error: {e}", file=sys.stderr)
+
+        # Only advance past changes that were fully scored; failed users are retried next pass
+        watermark = after_id
+        if failed == 0 and up_to_id > after_id:
+            watermark = settled_watermark(conn, after_id, up_to_id)
+            if watermark > after_id:
+                save_watermark(conn, watermark)
+    finally:
+        conn.close()
+    feature_monitor.flush()
+    try:
+        feature_monitor.compact()
+    except Exception as e:
+        print(f"⚠️ Feature monitor compaction failed: {e}", file=sys.stderr)
+
+    return {
+        'dirty_users': len(dirty),
+        'scores_written': written,
+        'failed_batches': failed,
+        'watermark': watermark,
+        'elapsed_seconds': time.perf_counter() - started
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Re-score users whose transactions changed')
+    parser.add_argument('--once', action='store_true', help='run a single pass and exit')
+    parser.add_argument('--interval', type=float, default=POLL_INTERVAL_SECONDS)
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--workers', type=int, default=MAX_WORKERS)
+    parser.add_argument('--rate', type=float, default=MAX_USERS_PER_SECOND, help='max users scored per second')
+    args = parser.parse_args()
+
+    while True:
+        try:
+            summary = run_once(args.batch_size, args.workers, args.rate)
+            print(f"✓ Re-scored {summary['scores_written']}/{summary['dirty_users']} dirty users "
+                  f"in {summary['elapsed_seconds']:.1f}s (watermark {summary['watermark']})", flush=True)
+        except Exception as e:
+            print(f"Scheduler error: {e}", file=sys.stderr, flush=True)
+        if args.once:
+            break
+        time.sleep(args.interval)
+
+
+if __name__ == '__main__':
+    main()
@@ -14,11 +14,16 @@ from sklearn.metrics import classification_report, roc_auc_score, confusion_matr
 import pickle
 import os
 import json
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import feature_monitor
 
 # Configuration
 N_SAMPLES = 5000
 RANDOM_STATE = 42
 MODEL_DIR = 'ml/models'
+SHARD_DIR = os.path.join(MODEL_DIR, 'training_data')
+N_SHARDS = 8
 
 def generate_training_data(n_samples=N_SAMPLES):
     """
@@ -139,6 +144,125 @@ def generate_training_data(n_samples=N_SAMPLES):
     df = pd.DataFrame(data)
     return df
 
+def generate_training_shard(n_samples, seed_sequence):
+    """
+    Generate one shard of synthetic training data from its own RNG stream
+
+    Vectorized equivalent of generate_training_data: the same feature
+    distributions and default rules, drawn column-wise from a Generator.
+    """
+    rng = np.random.default_rng(seed_sequence)
+    
+    # Base financial features (income drawn from a mixture of bands)
+    band = rng.choice(4, size=n_samples, p=[0.3, 0.4, 0.25, 0.05])
+    band_low = np.array([10000, 25000, 50000, 100000])
+    band_high = np.array([25000, 50000, 100000, 200000])
+    avg_monthly_income = rng.uniform(band_low[band], band_high[band])
+    
+    income_stability = rng.beta(8, 2, n_samples)
+    expense_to_income_ratio = np.clip(rng.beta(2, 3, n_samples), 0.3, 0.95)
+    emi_to_income_ratio = np.clip(rng.beta(1.5, 5, n_samples), 0, 0.6)
+    cashflow_consistency = rng.beta(5, 2, n_samples)
+    months_history = rng.choice([3, 6, 12, 18, 24, 36], size=n_samples,
+                                p=[0.1, 0.2, 0.3, 0.2, 0.15, 0.05])
+    has_credit_history = rng.choice([0, 1], size=n_samples, p=[0.3, 0.7])
+    credit_score = np.where(has_credit_history == 1, rng.uniform(300, 900, n_samples), 0.0)
+    business_age_years = np.clip(rng.exponential(3, n_samples), 0.5, 20)
+    
+    # Calculate default probability based on features
+    default_score = (
+        np.select([avg_monthly_income < 20000, avg_monthly_income < 40000], [30, 15], -10)
+        + np.select([income_stability < 0.6, income_stability > 0.8], [20, -15], 0)
+        + np.select([expense_to_income_ratio > 0.8, expense_to_income_ratio < 0.6], [25, -10], 0)
+        + np.select([emi_to_income_ratio > 0.4, emi_to_income_ratio < 0.2], [30, -5], 0)
+        + np.select([cashflow_consistency < 0.5, cashflow_consistency > 0.8], [20, -15], 0)
+        + np.select([(has_credit_history == 1) & (credit_score > 700),
+                     (has_credit_history == 1) & (credit_score < 500)], [-20, 25], 0)
+        + np.select([business_age_years < 1, business_age_years > 5], [15, -10], 0)
+        + np.select([months_history < 6, months_history >= 12], [15, -10], 0)
+    )
+    
+    default_prob = 1 / (1 + np.exp(-default_score / 20))
+    default_prob = np.clip(default_prob + rng.normal(0, 0.1, n_samples), 0, 1)
+    default = (rng.random(n_samples) < default_prob).astype(int)
+    
+    return pd.DataFrame({
+        'avg_monthly_income': avg_monthly_income,
+        'income_stability': income_stability,
+        'expense_to_income_ratio': expense_to_income_ratio,
+        'emi_to_income_ratio': emi_to_income_ratio,
+        'cashflow_consistency': cashflow_consistency,
+        'months_history': months_history,
+        'has_credit_history': has_credit_history,
+        'credit_score': credit_score,
+        'business_age_years': business_age_years,
+        'default': default
+    })
+
+def shard_path(output_dir, index, n_shards):
+    return os.path.join(output_dir, f'shard-{index:05d}-of-{n_shards:05d}.csv')
+
+def write_training_shard(task):
+    """
+    Generate and write one shard (runs in a worker process)
+    """
+    index, n_shards, n_samples, seed_sequence, output_dir = task
+    df = generate_training_shard(n_samples, seed_sequence)
+    path = shard_path(output_dir, index, n_shards)
+    df.to_csv(path, index=False)
+    return path
+
+def generate_sharded_training_data(n_samples=N_SAMPLES, n_shards=N_SHARDS, seed=RANDOM_STATE,
+                                   workers=None, output_dir=SHARD_DIR):
+    """
+    Generate training data as independent shards in a process pool
+
+    Each shard gets its own child of one SeedSequence and a size fixed by
+    (n_samples, n_shards), so the files are bit-identical for a given seed
+    and shard count however many workers run them.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    for name in os.listdir(output_dir):
+        if name.startswith('shard-'):
+            os.remove(os.path.join(output_dir, name))
+    
+    sizes = [len(part) for part in np.array_split(np.arange(n_samples), n_shards)]
+    children = np.random.SeedSequence(seed).spawn(n_shards)
+    tasks = [(i, n_shards, sizes[i], children[i], output_dir) for i in range(n_shards)]
+    
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        paths = list(pool.map(write_training_shard, tasks))
+    
+    manifest = {
+        'seed': seed,
+        'n_samples': n_samples,
+        'n_shards': n_shards,
+        'shard_sizes': sizes,
+        'shards': [os.path.basename(path) for path in paths]
+    }
+    with open(os.path.join(output_dir, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    
+    return manifest
+
+def load_training_shards(output_dir=SHARD_DIR):
+    """
+    Load a shard set in shard order
+    """
+    with open(os.path.join(output_dir, 'manifest.json'), 'r') as f:
+        manifest = json.load(f)
+    
+    frames = [pd.read_csv(os.path.join(output_dir, name)) for name in manifest['shards']]
+    return pd.concat(frames, ignore_index=True)
+
+def load_training_data():
+    """
+    Training data of the current model: the shard set, or the legacy single CSV
+    """
+    if os.path.exists(os.path.join(SHARD_DIR, 'manifest.json')):
+        return load_training_shards(SHARD_DIR)
+    return pd.read_csv(os.path.join(MODEL_DIR, 'training_data.csv'))
+
 def train_models(df):
     """
     Train multiple models and select the best one
@@ -242,34 +366,54 @@ def save_model(model, scaler, feature_columns, metrics):
     with open(metadata_path, 'w') as f:
         json.dump(metadata, f, indent=2)
     print(f"✓ Metadata saved to {metadata_path}")
+    
+    return metadata
+
+def save_feature_baseline(model, scaler, df, metadata):
+    """
+    Summarize the training distribution for drift monitoring
+    """
+    X = df[metadata['feature_columns']]
+    if 'Logistic' in metadata['model_type']:
+        probabilities = model.predict_proba(scaler.transform(X))[:, 1]
+    else:
+        probabilities = model.predict_proba(X)[:, 1]
+    
+    baseline = feature_monitor.build_baseline(X, probabilities, metadata['training_date'])
+    feature_monitor.save_json(baseline, feature_monitor.BASELINE_PATH)
+    print(f"✓ Feature baseline saved to {feature_monitor.BASELINE_PATH}")
 
 def main():
+    parser = argparse.ArgumentParser(description='Train the loan eligibility model')
+    parser.add_argument('--samples', type=int, default=N_SAMPLES)
+    parser.add_argument('--shards', type=int, default=N_SHARDS)
+    parser.add_argument('--workers', type=int, default=None, help='generator processes (default: CPU count)')
+    parser.add_argument('--seed', type=int, default=RANDOM_STATE)
+    args = parser.parse_args()
+    
     print("="*60)
     print("FinBridge ML Model Training")
     print("="*60)
     
     # Generate training data
-    print(f"\n1. Generating {N_SAMPLES} synthetic training samples...")
-    df = generate_training_data(N_SAMPLES)
+    print(f"\n1. Generating {args.samples} synthetic training samples in {args.shards} shards...")
+    generate_sharded_training_data(args.samples, args.shards, args.seed, args.workers)
+    print(f"✓ Training data shards saved to {SHARD_DIR}")
+    df = load_training_shards(SHARD_DIR)
     
     print(f"\nDataset shape: {df.shape}")
     print(f"Default rate: {df['default'].mean():.2%}")
     print("\nFeature statistics:")
     print(df.describe())
     
-    # Save training data
-    data_path = os.path.join(MODEL_DIR, 'training_data.csv')
-    os.makedirs(MODEL_DIR, exist_ok=True)
-    df.to_csv(data_path, index=False)
-    print(f"\n✓ Training data saved to {data_path}")
-    
     # Train models
     print("\n2. Training models...")
     model, scaler, feature_columns, auc_score = train_models(df)
     
     # Save model
     print("\n3. Saving model artifacts...")
-    save_model(model, scaler, feature_columns, auc_score)
+    metadata = save_model(model, scaler, feature_columns, auc_score)
+    save_feature_baseline(model, scaler, df, metadata)
     
     print("\n" + "="*60)
     print("Training completed successfully!")
@@ -277,7 +421,7 @@ def main():
     print("\nNext steps:")
     print("1. Test the model using: python ml/inference.py")
     print("2. Integrate with backend API")
-    print("3. Monitor model performance in production")
+    print("3. Monitor feature drift using: python ml/feature_monitor.py report")
 
 if __name__ == '__main__':
     main()
\ No newline at end of file